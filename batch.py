@@ -0,0 +1,221 @@
+import os
+import sys
+import time
+from collections import deque
+from engine import DEFAULT_COST_BUDGET, DEFAULT_PRECISION, FLOAT, calculate, normalize
+from cache import ResultCache
+
+DEFAULT_CHUNK_SIZE = 4 << 20
+
+# Per-process state used by pool workers
+worker_cache = None
+worker_vectorized = False
+worker_budget = DEFAULT_COST_BUDGET
+worker_mode = FLOAT
+worker_precision = DEFAULT_PRECISION
+worker_metrics = None
+
+
+def read_expressions(lines):
+    """Yield non-blank expressions from an iterable of lines, one at a time"""
+    for line in lines:
+        expression = normalize(line)
+        if expression:
+            yield expression
+
+
+def evaluate_expressions(expressions, cache=None, budget=DEFAULT_COST_BUDGET, mode=FLOAT,
+                         precision=DEFAULT_PRECISION, metrics=None):
+    """Yield 'expression = result' output lines using the calculator's rules"""
+    for expression in expressions:
+        yield f"{expression} = {calculate(expression, cache, budget, mode, precision, metrics)}\n"
+
+
+def evaluate_chunk(lines, cache=None, vectorized=False, budget=DEFAULT_COST_BUDGET, mode=FLOAT,
+                   precision=DEFAULT_PRECISION, metrics=None):
+    """Evaluate a list of input lines and return the joined output
+
+    The numpy path times the whole chunk as one 'vectorized' stage.
+    """
+    expressions = read_expressions(lines)
+    # numpy columns are binary floats, so exact modes always go row by row
+    if not vectorized or mode != FLOAT:
+        return ''.join(evaluate_expressions(expressions, cache, budget, mode, precision, metrics))
+    # Imported here so that loading this module does not load numpy
+    from vectorized import calculate_many
+    expressions = list(expressions)
+    start = time.perf_counter()
+    results = calculate_many(expressions, cache, budget)
+    if metrics is not None:
+        metrics.observe('vectorized', time.perf_counter() - start)
+    return ''.join([f"{expression} = {result}\n" for expression, result in zip(expressions, results)])
+
+
+def open_input(path):
+    """Open a file for streaming, with '-' meaning standard input"""
+    if path == '-':
+        return sys.stdin
+    return open(path, encoding='utf-8', buffering=1 << 20)
+
+
+def report_unreadable(path, error):
+    """Tell the user an input file could not be read, the way cat does"""
+    program = os.path.basename(sys.argv[0]) or 'batch'
+    print(f"{program}: cannot open {path}: {error.strerror or error}", file=sys.stderr)
+
+
+def init_worker(cache_size, vectorized, budget, mode, precision, measure=False):
+    """Give each pool process its own result cache and evaluation settings"""
+    global worker_cache, worker_vectorized, worker_budget, worker_mode, worker_precision
+    global worker_metrics
+    worker_cache = ResultCache(cache_size)
+    worker_vectorized = vectorized
+    worker_budget = budget
+    worker_mode = mode
+    worker_precision = precision
+    if measure:
+        from metrics import Metrics
+        worker_metrics = Metrics()
+
+
+def evaluate_lines(lines):
+    """Evaluate a chunk of lines in a pool worker
+
+    When the pool is measuring, the output comes with a snapshot of the
+    chunk's metrics for the parent to merge.
+    """
+    text = evaluate_chunk(lines, worker_cache, worker_vectorized, worker_budget, worker_mode,
+                          worker_precision, worker_metrics)
+    if worker_metrics is None:
+        return text
+    return text, worker_metrics.drain()
+
+
+def evaluate_shard(path, start, end):
+    """Evaluate the lines stored between two byte offsets of a file"""
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        data = handle.read(end - start)
+    return evaluate_lines(data.decode('utf-8').split('\n'))
+
+
+def file_shards(path, chunk_size):
+    """Yield (start, end) byte ranges of roughly chunk_size ending on newlines"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as handle:
+        start = 0
+        while start < size:
+            handle.seek(min(start + chunk_size, size))
+            handle.readline()
+            end = min(handle.tell(), size)
+            yield start, end
+            start = end
+
+
+def line_chunks(lines, chunk_size):
+    """Group lines into lists holding roughly chunk_size characters"""
+    chunk = []
+    length = 0
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= chunk_size:
+            yield chunk
+            chunk = []
+            length = 0
+    if chunk:
+        yield chunk
+
+
+def ordered_map(executor, function, argument_tuples, window):
+    """Like executor.map, but submits lazily with at most window tasks in flight"""
+    pending = deque()
+    for arguments in argument_tuples:
+        pending.append(executor.submit(function, *arguments))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def run_parallel(paths, output, workers, chunk_size, cache_size, vectorized, budget, mode,
+                 precision, metrics=None):
+    """Evaluate inputs on a process pool, writing results in input order
+
+    Returns True if every file could be read; unreadable ones are
+    reported and skipped.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    readable = True
+    initargs = (cache_size, vectorized, budget, mode, precision, metrics is not None)
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=initargs) as executor:
+        for path in paths:
+            if path == '-':
+                tasks = ((chunk,) for chunk in line_chunks(sys.stdin, chunk_size))
+                function = evaluate_lines
+            else:
+                try:
+                    with open(path, 'rb'):
+                        pass
+                except OSError as error:
+                    report_unreadable(path, error)
+                    readable = False
+                    continue
+                tasks = ((path, start, end) for start, end in file_shards(path, chunk_size))
+                function = evaluate_shard
+            for text in ordered_map(executor, function, tasks, workers * 2):
+                if metrics is not None:
+                    text, snapshot = text
+                    metrics.merge(snapshot)
+                output.write(text)
+    return readable
+
+
+def run_batch(paths, output=None, cache=None, workers=1, chunk_size=DEFAULT_CHUNK_SIZE,
+              vectorized=False, budget=DEFAULT_COST_BUDGET, mode=FLOAT, precision=DEFAULT_PRECISION,
+              metrics=None):
+    """Stream every expression in paths to output and return an exit status
+
+    A file that cannot be opened is reported on stderr and skipped, and
+    the status is then 1.
+    """
+    output = output if output is not None else sys.stdout
+    cache = cache if cache is not None else ResultCache()
+    paths = paths or ['-']
+    readable = True
+    try:
+        if workers > 1:
+            readable = run_parallel(paths, output, workers, chunk_size, cache.maxsize, vectorized,
+                                    budget, mode, precision, metrics)
+        else:
+            for path in paths:
+                try:
+                    handle = open_input(path)
+                except OSError as error:
+                    report_unreadable(path, error)
+                    readable = False
+                    continue
+                try:
+                    if vectorized:
+                        chunks = line_chunks(handle, chunk_size)
+                        output.writelines(evaluate_chunk(chunk, cache, True, budget, mode, precision,
+                                                         metrics)
+                                          for chunk in chunks)
+                    else:
+                        expressions = read_expressions(handle)
+                        output.writelines(evaluate_expressions(expressions, cache, budget, mode,
+                                                               precision, metrics))
+                finally:
+                    if handle is not sys.stdin:
+                        handle.close()
+        output.flush()
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head); stop quietly
+        sys.stderr.close()
+        return 1
+    cache.save()
+    return 0 if readable else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_batch(sys.argv[1:]))
@@ -0,0 +1,40 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bigint import accelerator, decimal_to_int, int_to_decimal
+
+SIZES = [1000, 10_000, 100_000, 300_000]
+
+
+def measure(function, argument):
+    """Return the milliseconds one call takes"""
+    start = time.perf_counter()
+    function(argument)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decimal conversion of large integers")
+    parser.add_argument('--digits', type=int, nargs='+', default=SIZES)
+    args = parser.parse_args()
+
+    # str() and int() refuse large values on Python 3.11+ unless lifted
+    if hasattr(sys, 'set_int_max_str_digits'):
+        sys.set_int_max_str_digits(0)
+    int_to_decimal(1 << 10_000)  # import decimal (or gmpy2) up front
+    print(f"gmpy2: {'yes' if accelerator() else 'no'}")
+    print(f"{'digits':>10} {'str()':>10} {'bigint':>10} {'int()':>10} {'bigint':>10}")
+    for digits in args.digits:
+        text = str(random.randrange(1, 10)) + ''.join(random.choices('0123456789', k=digits - 1))
+        value = int(text)
+        print(f"{digits:>10} {measure(str, value):>8.1f}ms {measure(int_to_decimal, value):>8.1f}ms "
+              f"{measure(int, text):>8.1f}ms {measure(decimal_to_int, text):>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tkinter as tk
+
+FRONTENDS = ['c1', 'ca']
+
+# Terms per expression for the calculate latency runs
+TERMS = [1, 10, 100, 1000]
+
+# History lengths add_to_history is timed at
+HISTORY_SIZES = [0, 1000, 10_000, 100_000]
+
+# Input lengths, in keys, for the click and keypress runs
+INPUT_LENGTHS = [1000, 10_000]
+
+# Keys typed in turn; digits and operators so the preview keeps working
+KEY_CYCLE = '12.5*3-4/7+'
+
+# A result is slower than its baseline by more than this fraction to count
+DEFAULT_THRESHOLD = 0.25
+
+# Display Xvfb is started on by --xvfb
+XVFB_DISPLAY = ':99'
+
+
+class KeyEvent:
+    """The parts of a Tk key event that handle_keypress reads"""
+
+    def __init__(self, char, keysym, widget=None):
+        self.char = char
+        self.keysym = keysym
+        self.widget = widget
+
+
+def best(function, repeat):
+    """Return the smallest of repeat results of function, the least disturbed run"""
+    return min(function() for _ in range(repeat))
+
+
+def expression_of(terms, seed):
+    """Return an expression of terms terms; seed keeps it out of the result cache"""
+    return '+'.join(f"{seed + term}*3-4/7" for term in range(terms))
+
+
+def wait_for_result(calculator, root):
+    """Run the event loop until the calculation in flight has been shown"""
+    while calculator.pending_expression is not None:
+        root.update()
+        time.sleep(0.0005)
+
+
+def bench_calculate(calculator, root, repeat):
+    """Milliseconds from pressing = to the result, by expression length"""
+    results = {}
+    seed = 0
+    for terms in TERMS:
+        def run():
+            nonlocal seed
+            seed += 1
+            calculator.input.set(expression_of(terms, seed * 100_000))
+            start = time.perf_counter()
+            calculator.calculate()
+            wait_for_result(calculator, root)
+            return (time.perf_counter() - start) * 1000
+        results[f'calculate/{terms}'] = best(run, repeat)
+    return results
+
+
+def bench_history(calculator, repeat, number=200):
+    """Milliseconds per add_to_history call with the history already at each size"""
+    results = {}
+    line = calculator.format_history(time.time(), '12345*6789', '83810205')
+    for size in HISTORY_SIZES:
+        calculator.history.clear()
+        calculator.history.extend([line] * size)
+
+        def run():
+            start = time.perf_counter()
+            for index in range(number):
+                calculator.add_to_history(f'{index}*2', str(index * 2))
+            elapsed = (time.perf_counter() - start) / number * 1000
+            for _ in range(number):
+                calculator.history.popleft()
+            return elapsed
+        results[f'history/{size}'] = best(run, repeat)
+    calculator.history.clear()
+    return results
+
+
+def bench_theme(calculator, root, repeat, number=50):
+    """Milliseconds per theme toggle, including the redraw it causes"""
+    def run():
+        start = time.perf_counter()
+        for _ in range(number):
+            calculator.toggle_theme()
+            root.update_idletasks()
+        return (time.perf_counter() - start) / number * 1000
+    return {'theme/toggle': best(run, repeat)}
+
+
+def bench_keys(calculator, root, repeat):
+    """Microseconds per key typed through on_button_click and handle_keypress"""
+    results = {}
+    for length in INPUT_LENGTHS:
+        keys = (KEY_CYCLE * (length // len(KEY_CYCLE) + 1))[:length]
+        events = [KeyEvent(key, key) for key in keys]
+
+        def click():
+            calculator.on_button_click('C')
+            start = time.perf_counter()
+            for key in keys:
+                calculator.on_button_click(key)
+            root.update_idletasks()
+            return (time.perf_counter() - start) / length * 1e6
+
+        def press():
+            calculator.on_button_click('C')
+            start = time.perf_counter()
+            for event in events:
+                calculator.handle_keypress(event)
+            root.update()
+            return (time.perf_counter() - start) / length * 1e6
+        results[f'click/{length}'] = best(click, repeat)
+        results[f'keypress/{length}'] = best(press, repeat)
+    calculator.on_button_click('C')
+    return results
+
+
+def open_root(args):
+    """Return a Tk root, starting Xvfb first when asked and there is no display"""
+    try:
+        return tk.Tk(), None
+    except tk.TclError as error:
+        if not args.xvfb or shutil.which('Xvfb') is None:
+            sys.exit(f"bench_calculator needs a display (run under xvfb-run or pass --xvfb): {error}")
+    server = subprocess.Popen(['Xvfb', XVFB_DISPLAY, '-screen', '0', '1024x768x24'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = XVFB_DISPLAY
+    deadline = time.perf_counter() + 5
+    while True:
+        try:
+            return tk.Tk(), server
+        except tk.TclError:
+            if time.perf_counter() > deadline:
+                server.terminate()
+                raise
+            time.sleep(0.1)
+
+
+def run_frontend(name, args):
+    """Run every benchmark against one front-end and return its results"""
+    root, server = open_root(args)
+    try:
+        if not args.show:
+            # Nothing is drawn on screen, but geometry and widget updates still run
+            root.withdraw()
+        calculator = importlib.import_module(name).Calculator(
+            root, history_size=max(HISTORY_SIZES) + 1000)
+        # A withdrawn root is never mapped, so start the worker and panels here
+        calculator.finish_startup()
+        root.update()
+        results = {}
+        results.update(bench_calculate(calculator, root, args.repeat))
+        results.update(bench_history(calculator, args.repeat))
+        results.update(bench_theme(calculator, root, args.repeat))
+        results.update(bench_keys(calculator, root, args.repeat))
+        calculator.on_close()
+        return results
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def compare(current, baseline, threshold):
+    """Print every result against the baseline and return the regressions"""
+    regressions = []
+    print(f"{'benchmark':<22} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for frontend, results in current['results'].items():
+        saved = baseline.get('results', {}).get(frontend, {})
+        for key, value in results.items():
+            if key not in saved:
+                continue
+            ratio = value / saved[key] if saved[key] else float('inf')
+            flag = ''
+            if ratio > 1 + threshold:
+                regressions.append(f'{frontend} {key}')
+                flag = '  REGRESSION'
+            print(f"{frontend + ' ' + key:<22} {saved[key]:>10.3f} {value:>10.3f} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of the calculator's hot paths in both front-ends")
+    parser.add_argument('--frontend', choices=FRONTENDS, nargs='+', default=FRONTENDS)
+    parser.add_argument('--repeat', type=int, default=5, help="best of this many runs is kept")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help="compare with a saved JSON file and exit 1 on a regression")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown, as a fraction, that counts as a regression")
+    parser.add_argument('--xvfb', action='store_true',
+                        help=f"start Xvfb on {XVFB_DISPLAY} when there is no display")
+    parser.add_argument('--show', action='store_true', help="map the window instead of withdrawing it")
+    args = parser.parse_args()
+
+    current = {
+        'python': platform.python_version(),
+        'tk': tk.TkVersion,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'units': {'calculate': 'ms', 'history': 'ms', 'theme': 'ms', 'click': 'us', 'keypress': 'us'},
+        'results': {},
+    }
+    for name in args.frontend:
+        results = run_frontend(name, args)
+        current['results'][name] = results
+        print(f"{name}:")
+        for key, value in results.items():
+            print(f"  {key:<18} {value:>10.3f}{current['units'][key.partition('/')[0]]}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(current, handle, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        print()
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import MODES, calculate, compile_expression, evaluate, run
+
+EXPRESSIONS = [
+    "12+7",
+    "3.5*2-1/4+7",
+    "1+2*3-4/5+6*7-8/9+10*11-12/13",
+    "2**-3**2+-7//2",
+]
+
+# Integer-only, fixed-point and general rational expressions, which take
+# different paths in the exact modes
+MODE_EXPRESSIONS = [
+    "123456789*987654321+42",
+    "19.99*3+4.25-0.1",
+    "1/3+1/6-2**-3",
+]
+
+
+def measure(function, expression, number=20000, repeat=5):
+    """Return the best per-call latency in microseconds"""
+    timings = timeit.repeat(lambda: function(expression), number=number, repeat=repeat)
+    return min(timings) / number * 1e6
+
+
+def main():
+    print(f"{'expression':<32} {'eval()':>10} {'engine':>10} {'compiled':>10}")
+    for expression in EXPRESSIONS:
+        program = compile_expression(expression)
+        baseline = measure(lambda e: eval(e, {'__builtins__': None}, {}), expression)
+        engine = measure(evaluate, expression)
+        compiled = measure(run, program)
+        print(f"{expression:<32} {baseline:>9.2f}us {engine:>9.2f}us {compiled:>9.2f}us")
+    print()
+    print(f"{'calculate()':<32}" + ''.join(f"{mode:>11}" for mode in MODES))
+    for expression in MODE_EXPRESSIONS:
+        timings = [measure(lambda e: calculate(e, mode=mode), expression) for mode in MODES]
+        print(f"{expression:<32}" + ''.join(f"{timing:>9.2f}us" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
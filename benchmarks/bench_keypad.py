@@ -0,0 +1,94 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tkinter as tk
+from tkinter import font as tkfont
+from c1 import DARK_THEME, LIGHT_THEME
+from keypad import CanvasKeypad
+from themes import button_class
+
+KEYS = [
+    ('M+', 0, 0), ('M-', 0, 1), ('MR', 0, 2), ('MC', 0, 3), ('⌫', 0, 4),
+    ('7', 1, 0), ('8', 1, 1), ('9', 1, 2), ('/', 1, 3), ('C', 1, 4),
+    ('4', 2, 0), ('5', 2, 1), ('6', 2, 2), ('*', 2, 3),
+    ('1', 3, 0), ('2', 3, 1), ('3', 3, 2), ('-', 3, 3),
+    ('0', 4, 0), ('.', 4, 1), ('=', 4, 2), ('+', 4, 3),
+]
+
+
+def build_buttons(parent, font, options):
+    """Build the keypad the way create_buttons does and return a theme switch"""
+    buttons = []
+    for text, row, column in KEYS:
+        button = tk.Button(parent, text=text, command=lambda t=text: None, font=font,
+                           borderwidth=0, width=4, height=2, relief="flat",
+                           **options[button_class(text)])
+        button.grid(row=row, column=column, padx=3, pady=3, sticky="nsew")
+        button.bind("<Enter>", lambda e, b=button: b.config(relief="raised"))
+        button.bind("<Leave>", lambda e, b=button: b.config(relief="flat"))
+        buttons.append((button, button_class(text)))
+
+    def apply_theme(options):
+        for button, role in buttons:
+            button.config(**options[role])
+    return apply_theme
+
+
+def build_canvas(parent, font, options):
+    """Build a CanvasKeypad and return its theme switch"""
+    keypad = CanvasKeypad(parent, KEYS, font, lambda text: None, options)
+    keypad.canvas.grid(row=0, column=0, sticky="nsew")
+    return keypad.apply_theme
+
+
+def tcl_commands(root):
+    """Number of Tcl commands, which counts widgets and Python callbacks"""
+    return len(root.tk.splitlist(root.tk.call('info', 'commands')))
+
+
+def measure(root, build, number):
+    """Return (build ms, Tcl commands added, theme switch ms) for one keypad"""
+    font = tkfont.Font(root=root, family="Arial", size=14)
+    frames = []
+    before = tcl_commands(root)
+    start = time.perf_counter()
+    for _ in range(number):
+        frame = tk.Frame(root)
+        frame.pack()
+        apply_theme = build(frame, font, LIGHT_THEME.options)
+        root.update_idletasks()
+        frames.append(frame)
+    built = (time.perf_counter() - start) / number * 1000
+    commands = (tcl_commands(root) - before) / number - 1
+    start = time.perf_counter()
+    for index in range(number):
+        apply_theme((DARK_THEME if index % 2 == 0 else LIGHT_THEME).options)
+        root.update_idletasks()
+    switched = (time.perf_counter() - start) / number * 1000
+    for frame in frames:
+        frame.destroy()
+    return built, commands, switched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Button grid versus canvas keypad")
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as error:
+        sys.exit(f"bench_keypad needs a display: {error}")
+    print(f"{'keypad':<10} {'build':>10} {'commands':>10} {'theme':>10}")
+    for name, build in (('buttons', build_buttons), ('canvas', build_canvas)):
+        built, commands, switched = measure(root, build, args.repeat)
+        print(f"{name:<10} {built:>8.2f}ms {commands:>10.0f} {switched:>8.3f}ms")
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
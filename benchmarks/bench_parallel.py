@@ -0,0 +1,60 @@
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch import DEFAULT_CHUNK_SIZE, run_batch
+from cache import ResultCache
+from engine import FLOAT, MODES
+
+
+def write_input(path, lines, seed=0):
+    """Write a synthetic expression log with mostly distinct lines"""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as handle:
+        for _ in range(lines):
+            handle.write(
+                f"{rng.randint(1, 99999)}*{rng.randint(1, 999)}"
+                f"+{rng.random():.4f}/{rng.randint(1, 99)}-{rng.randint(0, 9999)}\n"
+            )
+
+
+class NullOutput(io.TextIOBase):
+    """Discard output so the benchmark measures evaluation, not the sink"""
+
+    def write(self, text):
+        return len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch mode scaling benchmark")
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--arithmetic', choices=MODES, default=FLOAT)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'expressions.txt')
+        write_input(path, args.lines)
+        print(f"{args.lines} lines, {os.path.getsize(path) / 1e6:.1f} MB, {os.cpu_count()} CPUs")
+        baseline = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            run_batch([path], NullOutput(), ResultCache(), workers, args.chunk_size,
+                      mode=args.arithmetic)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(
+                f"workers={workers:<3} {elapsed:8.2f}s "
+                f"{args.lines / elapsed:12,.0f} lines/s  speedup {baseline / elapsed:5.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
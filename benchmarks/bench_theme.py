@@ -0,0 +1,75 @@
+import argparse
+import importlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tkinter as tk
+from themes import button_class
+
+
+def legacy_update(calculator):
+    """Recolor the way update_theme_colors did before themes.py
+
+    Every palette color is assigned to an attribute, the fixed widgets
+    are configured one by one, and the keypad is walked asking each
+    button for its text to look up four colors.
+    """
+    theme = calculator.theme
+    for key, value in theme.colors.items():
+        setattr(calculator, key, value)
+    for role, widgets in calculator.themed_widgets.items():
+        if role in ('digit', 'operator', 'special'):
+            continue
+        for widget in widgets:
+            widget.config(**theme.options[role])
+    for child in calculator.button_frame.winfo_children():
+        if isinstance(child, tk.Button):
+            text = child.cget('text')
+            prefix = {'operator': 'operator', 'special': 'special', 'digit': 'button'}[button_class(text)]
+            child.config(
+                bg=getattr(calculator, prefix + '_bg'),
+                fg=getattr(calculator, prefix + '_fg'),
+                activebackground=getattr(calculator, prefix + '_active_bg'),
+                activeforeground=getattr(calculator, prefix + '_fg')
+            )
+
+
+def measure(root, toggle, number):
+    """Return the mean milliseconds per theme switch, including the redraw"""
+    start = time.perf_counter()
+    for _ in range(number):
+        toggle()
+        root.update_idletasks()
+    return (time.perf_counter() - start) / number * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Theme toggle latency benchmark")
+    parser.add_argument('--frontend', choices=['c1', 'ca'], default='c1')
+    parser.add_argument('--toggles', type=int, default=200)
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as error:
+        sys.exit(f"bench_theme needs a display: {error}")
+    calculator = importlib.import_module(args.frontend).Calculator(root, history_size=0)
+    root.update()
+
+    def legacy_toggle():
+        calculator.theme_index = (calculator.theme_index + 1) % len(calculator.themes)
+        calculator.theme = calculator.themes[calculator.theme_index]
+        legacy_update(calculator)
+
+    legacy = measure(root, legacy_toggle, args.toggles)
+    current = measure(root, calculator.toggle_theme, args.toggles)
+    print(f"{'attribute walk':<16} {legacy:>8.3f}ms per toggle")
+    print(f"{'cached options':<16} {current:>8.3f}ms per toggle")
+    calculator.on_close()
+
+
+if __name__ == "__main__":
+    main()
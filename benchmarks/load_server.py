@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from server import DEFAULT_HOST, DEFAULT_PORT
+
+# Mostly cheap expressions with the odd expensive power and failure
+EXPRESSIONS = ['1+2', '12345*6789', '2**0.5*3', '(1+2)*3/4', '10//3-7', '2**1000', '1/0',
+               '3**100000']
+
+
+def random_expression(rng):
+    """Return a distinct cheap expression, so the server cache does not answer everything"""
+    return f"{rng.randint(1, 99999)}*{rng.randint(1, 999)}+{rng.random():.4f}/{rng.randint(1, 99)}"
+
+
+def encode_request(host, port, path, document):
+    """Return the bytes of a keep-alive POST carrying a JSON document"""
+    body = json.dumps(document).encode('utf-8')
+    head = (f"POST {path} HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+async def read_response(reader):
+    """Read one response and return its status code"""
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def client(args, deadline, latencies, failures, seed):
+    """Send requests over one keep-alive connection until the deadline"""
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    try:
+        while time.perf_counter() < deadline:
+            sent = []
+            # Write a whole pipeline before reading any of its answers
+            for _ in range(args.pipeline):
+                if args.batch:
+                    path = '/batch'
+                    document = {'expressions': [random_expression(rng) for _ in range(args.batch)]}
+                elif rng.random() < args.distinct:
+                    path, document = '/evaluate', {'expression': random_expression(rng)}
+                else:
+                    path, document = '/evaluate', {'expression': rng.choice(EXPRESSIONS)}
+                writer.write(encode_request(args.host, args.port, path, document))
+                sent.append(time.perf_counter())
+            await writer.drain()
+            for start in sent:
+                if await read_response(reader) != 200:
+                    failures.append(start)
+                latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+def percentile(ordered, fraction):
+    """Return the value below which fraction of the sorted values fall"""
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+async def wait_for_server(host, port, timeout=10.0):
+    """Wait until something accepts connections on host and port"""
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+        else:
+            writer.close()
+            return
+
+
+async def run(args):
+    """Drive the server with every client at once; return latencies, failures and seconds taken"""
+    await wait_for_server(args.host, args.port)
+    latencies = []
+    failures = []
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*[client(args, deadline, latencies, failures, seed)
+                           for seed in range(args.connections)])
+    return latencies, failures, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the evaluation service")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--connections', type=int, default=16)
+    parser.add_argument('--pipeline', type=int, default=1,
+                        help="requests written on a connection before reading their answers")
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--distinct', type=float, default=0.5,
+                        help="share of requests with a fresh expression that misses the cache")
+    parser.add_argument('--batch', type=int, default=0,
+                        help="send /batch requests of this many expressions instead")
+    parser.add_argument('--spawn', action='store_true',
+                        help="start a server on --port for the run and stop it afterwards")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'server.py'),
+                                   '--host', args.host, '--port', str(args.port)])
+    try:
+        latencies, failures, elapsed = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    latencies.sort()
+    if not latencies:
+        print("no requests completed")
+        return
+    expressions = len(latencies) * (args.batch or 1)
+    print(f"{args.connections} connections, pipeline {args.pipeline}, {elapsed:.1f}s")
+    print(f"{len(latencies):,} requests ({expressions:,} expressions), {len(failures)} failed")
+    print(f"{len(latencies) / elapsed:12,.0f} requests/s  {expressions / elapsed:12,.0f} expressions/s")
+    print(f"latency p50 {percentile(latencies, 0.5) * 1000:.2f}ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f}ms  max {latencies[-1] * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Integers up to this size go through int() and str() directly; both are
+# quadratic, but fast at this size and well under Python's limit of 4300
+# digits for int/str conversion
+SMALL_BITS = 8192
+SMALL_DIGITS = 2400
+
+# Binary pieces up to this many bits are converted to Decimal directly
+DECIMAL_PIECE_BITS = 128
+
+# gmpy2.mpz if it is installed, False if it is not, None until first use
+mpz = None
+
+
+def accelerator():
+    """Return gmpy2's mpz type, or None when gmpy2 is not installed"""
+    global mpz
+    if mpz is None:
+        try:
+            from gmpy2 import mpz as found
+        except ImportError:
+            found = False
+        mpz = found
+    return mpz or None
+
+
+def int_to_decimal(value):
+    """Return str(value) for an int of any size, in subquadratic time
+
+    Without gmpy2 the value is split into binary halves, which are
+    recombined as Decimals; libmpdec multiplies large numbers in
+    subquadratic time, and printing a Decimal is linear.
+    """
+    if value.bit_length() <= SMALL_BITS:
+        return str(value)
+    fast = accelerator()
+    if fast is not None:
+        return fast(value).digits(10)
+    import decimal
+    Decimal = decimal.Decimal
+    powers = {}
+
+    def power_of_two(bits):
+        result = powers.get(bits)
+        if result is None:
+            if bits <= DECIMAL_PIECE_BITS:
+                result = Decimal(1 << bits)
+            else:
+                half = bits >> 1
+                result = power_of_two(half) * power_of_two(bits - half)
+            powers[bits] = result
+        return result
+
+    def convert(value, bits):
+        if bits <= DECIMAL_PIECE_BITS:
+            return Decimal(value)
+        half = bits >> 1
+        high = value >> half
+        low = value - (high << half)
+        return convert(high, bits - half) * power_of_two(half) + convert(low, half)
+
+    with decimal.localcontext() as context:
+        context.prec = decimal.MAX_PREC
+        context.Emax = decimal.MAX_EMAX
+        context.Emin = decimal.MIN_EMIN
+        context.traps[decimal.Inexact] = True
+        text = str(convert(abs(value), value.bit_length()))
+    return '-' + text if value < 0 else text
+
+
+def decimal_to_int(text):
+    """Return int(text) for a string of decimal digits of any length, in subquadratic time
+
+    Without gmpy2 the digits are split in halves and recombined with
+    multiplications by powers of ten, which Python does with Karatsuba.
+    """
+    if len(text) <= SMALL_DIGITS:
+        return int(text)
+    fast = accelerator()
+    if fast is not None:
+        return int(fast(text))
+    powers = {}
+
+    def power_of_ten(digits):
+        result = powers.get(digits)
+        if result is None:
+            result = powers[digits] = 10 ** digits
+        return result
+
+    def convert(start, end):
+        if end - start <= SMALL_DIGITS:
+            return int(text[start:end])
+        middle = end - (end - start) // 2
+        return convert(start, middle) * power_of_ten(end - middle) + convert(middle, end)
+
+    return convert(0, len(text))
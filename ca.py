@@ -1,10 +1,82 @@
+import time
+
+# Taken before the other imports, for --startup-profile
+STARTED = time.perf_counter()
+
+import sys
+from collections import deque
+from itertools import islice
 import tkinter as tk
 from tkinter import font as tkfont
-import re
-from math import isfinite
+from engine import (DEFAULT_COST_BUDGET, DEFAULT_PRECISION, ERROR, FLOAT, TOO_COMPLEX, cache_key,
+                    normalize, preflight)
+from cache import ResultCache
+from inputbuffer import GapBuffer, window
+from preview import IncrementalEvaluator
+from virtuallist import VirtualList
+from themes import Theme, button_class, load_theme
+from keypad import CanvasKeypad
+import cli
+
+# Seconds to wait for a result before showing the computing state
+FAST_RESULT_TIMEOUT = 0.02
+# Milliseconds between checks for a result from the worker process
+POLL_INTERVAL = 20
+# Shown in the display where the cursor is when it is not at the end
+CURSOR_MARK = '│'
+# Characters that can be typed or pasted into the expression
+TYPED_CHARACTERS = frozenset('0123456789.+-*/()')
+# Characters of a long input or result given to the display at once
+DISPLAY_WINDOW = 64
+# Inputs longer than this are not previewed, as re-parsing them on every
+# keystroke would lag
+PREVIEW_LIMIT = 10_000
+# Calculations kept in memory when there is no history store
+HISTORY_SIZE = 1000
+
+LIGHT_THEME = Theme('light', {
+    'bg_color': "#f0f0f0",
+    'display_bg': "#ffffff",
+    'display_fg': "#000000",
+    'button_bg': "#e0e0e0",
+    'button_fg': "#000000",
+    'button_active_bg': "#d0d0d0",
+    'button_active_fg': "#000000",
+    'operator_bg': "#ff9500",
+    'operator_fg': "#ffffff",
+    'operator_active_bg': "#ffaa33",
+    'special_bg': "#a6a6a6",
+    'special_fg': "#000000",
+    'special_active_bg': "#bfbfbf",
+    'history_bg': "#ffffff",
+    'history_fg': "#000000",
+    'history_disabled_bg': "#f0f0f0",
+})
+
+DARK_THEME = Theme('dark', {
+    'bg_color': "#2d2d2d",
+    'display_bg': "#3d3d3d",
+    'display_fg': "#ffffff",
+    'button_bg': "#4d4d4d",
+    'button_fg': "#ffffff",
+    'button_active_bg': "#5d5d5d",
+    'button_active_fg': "#ffffff",
+    'operator_bg': "#ff9500",
+    'operator_fg': "#ffffff",
+    'operator_active_bg': "#ffaa33",
+    'special_bg': "#a6a6a6",
+    'special_fg': "#000000",
+    'special_active_bg': "#bfbfbf",
+    'history_bg': "#3d3d3d",
+    'history_fg': "#ffffff",
+    'history_disabled_bg': "#3d3d3d",
+}, dark=True)
 
 class Calculator:
-    def __init__(self, root):
+    def __init__(self, root, cache=None, worker=None, cost_budget=DEFAULT_COST_BUDGET,
+                 history_size=HISTORY_SIZE, history_store=None, theme_files=(),
+                 canvas_keypad=False, shared=False, mode=FLOAT, precision=DEFAULT_PRECISION,
+                 metrics=None):
         self.root = root
         self.root.title("vishwa's Calculator")
         self.root.geometry("480x500")
@@ -13,8 +85,46 @@ class Calculator:
         # Initialize variables
         self.current_input = tk.StringVar()
         self.current_input.set("0")
-        self.history = []
-        self.dark_mode = False
+        self.input = GapBuffer("0")
+        self.evaluator = IncrementalEvaluator()
+        self.preview_text = tk.StringVar()
+        self.display_refresh_pending = False
+        # Keystrokes and pastes waiting for the next idle tick
+        self.typed = []
+        self.typed_flush_pending = False
+        self.history = deque(maxlen=history_size)
+        self.history_store = history_store
+        # A daemon's store is shared with its other windows and outlives this one
+        self.shared = shared
+        self.history_search = tk.StringVar()
+        self.history_matches = None
+        self.history_frame = None
+        self.history_list = None
+        self.search_entry = None
+        # Named variables, with their panel under the history
+        self.worksheet = None
+        self.variable_text = tk.StringVar()
+        self.variable_entry = None
+        self.variables_list = None
+        self.cache = cache if cache is not None else ResultCache()
+        self.cost_budget = cost_budget
+        # Arithmetic used by the worker; the preview always uses floats
+        self.mode = mode
+        self.precision = precision
+        # Per-stage timings and error counts, or None when not collecting
+        self.metrics = metrics
+        self.submitted = 0.0
+        # Started with the history panel once the window is on screen
+        self.worker = worker
+        self.started = False
+        self.pending_expression = None
+        self.themes = [LIGHT_THEME, DARK_THEME]
+        self.themes += [load_theme(path, LIGHT_THEME, DARK_THEME) for path in theme_files]
+        self.theme_index = 0
+        self.canvas_keypad = canvas_keypad
+        self.keypad = None
+        # Function table window, opened on demand
+        self.table_window = None
         self.history_visible = True
         
         # Define fonts
@@ -30,45 +140,18 @@ class Calculator:
         
         # Bind keyboard events
         self.root.bind('<Key>', self.handle_keypress)
+        self.root.bind('<<Paste>>', self.paste)
+        self.root.bind('<<Copy>>', self.copy_input)
+        if self.metrics is not None:
+            self.root.bind('<F12>', self.dump_metrics)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.bind('<Map>', self.on_map, add='+')
         
     def set_theme(self):
-        """Set the color scheme based on current theme mode"""
-        if self.dark_mode:
-            # Dark theme colors
-            self.bg_color = "#2d2d2d"
-            self.display_bg = "#3d3d3d"
-            self.display_fg = "#ffffff"
-            self.button_bg = "#4d4d4d"
-            self.button_fg = "#ffffff"
-            self.button_active_bg = "#5d5d5d"
-            self.button_active_fg = "#ffffff"
-            self.operator_bg = "#ff9500"
-            self.operator_fg = "#ffffff"
-            self.operator_active_bg = "#ffaa33"
-            self.special_bg = "#a6a6a6"
-            self.special_fg = "#000000"
-            self.special_active_bg = "#bfbfbf"
-            self.history_bg = "#3d3d3d"
-            self.history_fg = "#ffffff"
-            self.history_disabled_bg = "#3d3d3d"
-        else:
-            # Light theme colors
-            self.bg_color = "#f0f0f0"
-            self.display_bg = "#ffffff"
-            self.display_fg = "#000000"
-            self.button_bg = "#e0e0e0"
-            self.button_fg = "#000000"
-            self.button_active_bg = "#d0d0d0"
-            self.button_active_fg = "#000000"
-            self.operator_bg = "#ff9500"
-            self.operator_fg = "#ffffff"
-            self.operator_active_bg = "#ffaa33"
-            self.special_bg = "#a6a6a6"
-            self.special_fg = "#000000"
-            self.special_active_bg = "#bfbfbf"
-            self.history_bg = "#ffffff"
-            self.history_fg = "#000000"
-            self.history_disabled_bg = "#f0f0f0"
+        """Make the current theme's palette the color attributes used by create_widgets"""
+        self.theme = self.themes[self.theme_index]
+        self.dark_mode = self.theme.dark
+        self.__dict__.update(self.theme.colors)
     
     def create_widgets(self):
         """Create all the widgets for the calculator"""
@@ -98,6 +181,17 @@ class Calculator:
         )
         self.display.pack(fill=tk.X, ipady=10)
         
+        # Live result of the expression being typed
+        self.preview_label = tk.Label(
+            self.display_frame,
+            textvariable=self.preview_text,
+            font=self.history_font,
+            bg=self.display_bg,
+            fg=self.history_fg,
+            anchor=tk.E
+        )
+        self.preview_label.pack(fill=tk.X)
+        
         # Create theme toggle button
         self.theme_btn = tk.Button(
             self.display_frame,
@@ -114,7 +208,69 @@ class Calculator:
         )
         self.theme_btn.pack(side=tk.RIGHT, padx=(5, 0))
         
-        # Create history frame
+        # Create history toggle button
+        self.history_btn = tk.Button(
+            self.button_frame,
+            text="Hide History" if self.history_visible else "Show History",
+            command=self.toggle_history,
+            bg=self.special_bg,
+            fg=self.special_fg,
+            activebackground=self.special_active_bg,
+            activeforeground=self.special_fg,
+            borderwidth=0,
+            font=self.button_font
+        )
+        self.history_btn.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 5))
+        
+        # Create function table button
+        self.table_btn = tk.Button(
+            self.button_frame,
+            text="Table",
+            command=self.open_table,
+            bg=self.special_bg,
+            fg=self.special_fg,
+            activebackground=self.special_active_bg,
+            activeforeground=self.special_fg,
+            borderwidth=0,
+            font=self.button_font
+        )
+        self.table_btn.grid(row=0, column=3, columnspan=2, sticky="ew", padx=(4, 2), pady=(0, 5))
+        
+        # Widgets to recolor on a theme switch, by role
+        self.themed_widgets = {
+            'frame': [self.root, self.display_frame, self.button_frame],
+            'display': [self.display],
+            'preview': [self.preview_label],
+            'history_frame': [],
+            'history_label': [],
+            'history_list': [],
+            'search': [],
+            'digit': [],
+            'operator': [],
+            'special': [self.history_btn, self.table_btn],
+        }
+        
+        # Create calculator buttons
+        buttons = [
+            ('7', 1, 0), ('8', 1, 1), ('9', 1, 2), ('/', 1, 3), ('⌫', 1, 4),
+            ('4', 2, 0), ('5', 2, 1), ('6', 2, 2), ('*', 2, 3), ('C', 2, 4),
+            ('1', 3, 0), ('2', 3, 1), ('3', 3, 2), ('-', 3, 3), ('(', 3, 4),
+            ('0', 4, 0), ('.', 4, 1), ('=', 4, 2), ('+', 4, 3), (')', 4, 4)
+        ]
+        
+        if self.canvas_keypad:
+            self.create_canvas_keypad(buttons)
+        else:
+            self.create_buttons(buttons)
+        
+        # Configure grid weights
+        for i in range(5):
+            self.button_frame.grid_columnconfigure(i, weight=1)
+        for i in range(5):
+            self.button_frame.grid_rowconfigure(i + 1, weight=1)
+    
+    def create_history_panel(self):
+        """Create the history frame, search box and list"""
         self.history_frame = tk.Frame(
             self.root,
             bg=self.history_bg,
@@ -132,42 +288,103 @@ class Calculator:
         )
         self.history_label.pack(pady=(5, 0))
         
-        self.history_text = tk.Text(
+        # Search box; matches expression prefixes and exact results
+        self.search_entry = tk.Entry(
             self.history_frame,
-            bg=self.history_disabled_bg,
+            textvariable=self.history_search,
+            bg=self.history_bg,
             fg=self.history_fg,
+            insertbackground=self.history_fg,
             font=self.history_font,
-            state=tk.DISABLED,
-            wrap=tk.WORD,
+            relief=tk.FLAT
+        )
+        self.search_entry.pack(fill=tk.X, padx=5, pady=(0, 5))
+        self.history_search.trace_add('write', self.search_history)
+        
+        self.history_list = VirtualList(
+            self.history_frame,
+            self.history_font,
+            self.history_row_count,
+            self.history_rows,
+            fg=self.history_fg,
+            bg=self.history_disabled_bg,
             height=20,
-            padx=5,
-            pady=5,
+            padding=5,
             borderwidth=0
         )
-        self.history_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=(0, 5))
+        self.history_list.canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=(0, 5))
         
-        # Create history toggle button
-        self.history_btn = tk.Button(
-            self.button_frame,
-            text="Hide History" if self.history_visible else "Show History",
-            command=self.toggle_history,
-            bg=self.special_bg,
-            fg=self.special_fg,
-            activebackground=self.special_active_bg,
-            activeforeground=self.special_fg,
-            borderwidth=0,
+        # Recolor the panel on theme switches too
+        self.themed_widgets['history_frame'].append(self.history_frame)
+        self.themed_widgets['history_label'].append(self.history_label)
+        self.themed_widgets['history_list'].append(self.history_list)
+        self.themed_widgets['search'].append(self.search_entry)
+    
+    def create_variables_panel(self):
+        """Create the variables list and its 'name = formula' box under the history"""
+        self.variables_label = tk.Label(
+            self.history_frame,
+            text="Variables",
+            bg=self.history_bg,
+            fg=self.history_fg,
             font=self.button_font
         )
-        self.history_btn.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 5))
+        self.variables_label.pack(pady=(5, 2))
         
-        # Create calculator buttons
-        buttons = [
-            ('7', 1, 0), ('8', 1, 1), ('9', 1, 2), ('/', 1, 3), ('⌫', 1, 4),
-            ('4', 2, 0), ('5', 2, 1), ('6', 2, 2), ('*', 2, 3), ('C', 2, 4),
-            ('1', 3, 0), ('2', 3, 1), ('3', 3, 2), ('-', 3, 3), ('', 3, 4),
-            ('0', 4, 0), ('.', 4, 1), ('=', 4, 2), ('+', 4, 3), ('', 4, 4)
-        ]
+        # Enter applies a definition; an empty formula removes the variable
+        self.variable_entry = tk.Entry(
+            self.history_frame,
+            textvariable=self.variable_text,
+            bg=self.history_bg,
+            fg=self.history_fg,
+            insertbackground=self.history_fg,
+            font=self.history_font,
+            relief=tk.FLAT
+        )
+        self.variable_entry.pack(fill=tk.X, padx=5, pady=(0, 5))
+        self.variable_entry.bind('<Return>', self.define_variable)
+        
+        self.variables_list = VirtualList(
+            self.history_frame,
+            self.history_font,
+            self.worksheet.__len__,
+            self.worksheet.rows,
+            fg=self.history_fg,
+            bg=self.history_disabled_bg,
+            height=5,
+            borderwidth=0
+        )
+        self.variables_list.canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=(0, 5))
+        self.variables_list.canvas.bind('<Double-Button-1>', self.use_variable)
         
+        self.themed_widgets['history_label'].append(self.variables_label)
+        self.themed_widgets['history_list'].append(self.variables_list)
+        self.themed_widgets['search'].append(self.variable_entry)
+    
+    def on_map(self, event):
+        """Finish starting up once the window has been drawn for the first time"""
+        if event.widget is self.root and not self.started:
+            self.root.after_idle(self.finish_startup)
+    
+    def finish_startup(self):
+        """Do the setup the first frame does not need: worker, history panel and store"""
+        if self.started:
+            return
+        self.started = True
+        from worker import EvaluationWorker
+        from worksheet import Worksheet
+        self.worksheet = Worksheet(self.mode, self.precision, self.cost_budget)
+        if self.worker is None:
+            self.worker = EvaluationWorker(self.cost_budget, self.mode, self.precision,
+                                           self.metrics)
+        if self.history_store is not None:
+            self.history_store.start()
+        self.create_history_panel()
+        self.create_variables_panel()
+        self.position_history()
+    
+    def create_buttons(self, buttons):
+        """Create a Button for each (text, row, column) key"""
         for (text, row, col) in buttons:
             if not text:
                 continue  # Skip empty buttons
@@ -176,32 +393,29 @@ class Calculator:
                 self.button_frame,
                 text=text,
                 command=lambda t=text: self.on_button_click(t),
-                bg=self.get_button_bg(text),
-                fg=self.get_button_fg(text),
-                activebackground=self.get_button_active_bg(text),
-                activeforeground=self.get_button_fg(text),
+                **self.theme.options[button_class(text)],
                 font=self.button_font,
                 borderwidth=0,
                 width=4,
                 height=2
             )
             btn.grid(row=row, column=col, padx=2, pady=2, sticky="nsew")
+            self.themed_widgets[button_class(text)].append(btn)
             
             # Bind hover effects
             btn.bind("<Enter>", lambda e, b=btn: self.on_button_hover(e, b))
             btn.bind("<Leave>", lambda e, b=btn: self.on_button_hover_leave(e, b))
-        
-        # Configure grid weights
-        for i in range(5):
-            self.button_frame.grid_columnconfigure(i, weight=1)
-        for i in range(5):
-            self.button_frame.grid_rowconfigure(i + 1, weight=1)
-        
-        # Position history frame
-        self.position_history()
+    
+    def create_canvas_keypad(self, buttons):
+        """Draw the (text, row, column) keys on a single canvas"""
+        self.keypad = CanvasKeypad(self.button_frame, buttons, self.button_font,
+                                   self.on_button_click, self.theme.options)
+        self.keypad.canvas.grid(row=1, column=0, rowspan=4, columnspan=5, sticky="nsew")
     
     def position_history(self):
         """Position the history frame based on visibility"""
+        if self.history_frame is None:
+            return
         if self.history_visible:
             self.button_frame.pack_forget()
             self.history_frame.pack_forget()
@@ -221,33 +435,6 @@ class Calculator:
             self.history_frame.pack_forget()
             self.button_frame.pack(pady=5, padx=10, fill=tk.BOTH, expand=True)
     
-    def get_button_bg(self, text):
-        """Get background color based on button type"""
-        if text in {'+', '-', '*', '/', '='}:
-            return self.operator_bg
-        elif text in {'C', '⌫'}:
-            return self.special_bg
-        else:
-            return self.button_bg
-    
-    def get_button_fg(self, text):
-        """Get foreground color based on button type"""
-        if text in {'+', '-', '*', '/', '='}:
-            return self.operator_fg
-        elif text in {'C', '⌫'}:
-            return self.special_fg
-        else:
-            return self.button_fg
-    
-    def get_button_active_bg(self, text):
-        """Get active background color based on button type"""
-        if text in {'+', '-', '*', '/', '='}:
-            return self.operator_active_bg
-        elif text in {'C', '⌫'}:
-            return self.special_active_bg
-        else:
-            return self.button_active_bg
-    
     def on_button_hover(self, event, button):
         """Handle button hover effect"""
         text = button.cget('text')
@@ -257,139 +444,339 @@ class Calculator:
     def on_button_hover_leave(self, event, button):
         """Handle button hover leave effect"""
         text = button.cget('text')
-        button.config(bg=self.get_button_bg(text))
+        button.config(bg=self.theme.options[button_class(text)]['bg'])
     
     def on_button_click(self, text):
         """Handle button clicks"""
-        current = self.current_input.get()
+        # Keys typed before this click go in first
+        self.flush_typed()
         
-        if text.isdigit() or text == '.':
-            if current == '0' or current == 'Error':
-                self.current_input.set(text)
-            else:
-                self.current_input.set(current + text)
-        elif text in {'+', '-', '*', '/'}:
-            if current == 'Error':
-                self.current_input.set('0' + text)
-            else:
-                self.current_input.set(current + text)
+        # Only C does anything while a result is being computed
+        if self.pending_expression is not None:
+            if text == 'C':
+                self.cancel_calculation()
+                self.input.set('0')
+                self.refresh_display()
+            return
+        
+        # Edit the input buffer at the cursor
+        if text in TYPED_CHARACTERS:
+            self.insert_typed(text)
         elif text == '⌫':
-            if current == 'Error':
-                self.current_input.set('0')
+            if self.input_shows_error():
+                self.input.set('0')
             else:
-                self.current_input.set(current[:-1] if len(current) > 1 else '0')
+                self.input.delete_before()
+                if not len(self.input):
+                    self.input.set('0')
         elif text == 'C':
-            self.current_input.set('0')
+            self.input.set('0')
         elif text == '=':
             self.calculate()
+        
+        self.refresh_display()
     
-    def calculate(self):
-        """Evaluate the expression and display result"""
-        expression = self.current_input.get()
+    def input_shows_error(self):
+        """Check whether the input holds an error message, not an expression"""
+        return self.input.equals(ERROR) or self.input.equals(TOO_COMPLEX)
+    
+    def input_is_placeholder(self):
+        """Check whether the input is 0 or an error that typing replaces"""
+        return self.input_shows_error() or self.input.equals('0')
+    
+    def insert_typed(self, text):
+        """Insert characters at the cursor as if their keys were pressed in turn"""
+        if self.input_is_placeholder():
+            # Typing replaces 0 or an error, and leading zeros only retype the 0
+            text = text.lstrip('0')
+            self.input.set('0' if not text or text[0] in '+-*/' else '')
+        self.input.insert(text)
+    
+    def queue_typed(self, text):
+        """Queue characters to be inserted in one edit on the next idle tick"""
+        self.typed.append(text)
+        if not self.typed_flush_pending:
+            self.typed_flush_pending = True
+            self.root.after_idle(self.flush_typed)
+    
+    def flush_typed(self):
+        """Insert every queued character at once and schedule one redraw"""
+        self.typed_flush_pending = False
+        if not self.typed:
+            return
+        text = ''.join(self.typed)
+        self.typed.clear()
+        # Typing is ignored while a result is being computed
+        if self.pending_expression is None:
+            self.insert_typed(text)
+            self.refresh_display()
+    
+    def paste(self, event=None):
+        """Type the expression on the clipboard, or beep if it is not one"""
+        if event is not None and event.widget is self.search_entry:
+            return
+        try:
+            text = self.root.clipboard_get()
+        except tk.TclError:
+            return
+        text = ''.join(normalize(text).split())
+        if text and TYPED_CHARACTERS.issuperset(text):
+            self.queue_typed(text)
+        else:
+            self.root.bell()
+    
+    def copy_input(self, event=None):
+        """Copy the whole expression or result, not just the part on display"""
+        if event is not None and event.widget is self.search_entry:
+            return
+        self.root.clipboard_clear()
+        self.root.clipboard_append(self.input.text())
+    
+    def move_cursor(self, offset):
+        """Move the input cursor left or right"""
+        if self.pending_expression is None:
+            self.input.move(offset)
+            self.refresh_display()
+    
+    def refresh_display(self):
+        """Schedule one display update for all edits made in this event"""
+        if not self.display_refresh_pending:
+            self.display_refresh_pending = True
+            self.root.after_idle(self.sync_display)
+    
+    def sync_display(self):
+        """Copy the input buffer to the display, marking the cursor"""
+        self.display_refresh_pending = False
+        if self.pending_expression is not None:
+            self.current_input.set("Computing…")
+            self.preview_text.set("")
+            return
         
+        # However long the input, Tk only gets a window around the cursor,
+        # and only that window is read out of the buffer
+        self.update_preview()
+        cursor = self.input.cursor
+        at_end = cursor == len(self.input)
+        text, cursor = window(self.input, cursor, DISPLAY_WINDOW)
+        
+        # Show where the cursor is unless it is at the end
+        if not at_end:
+            text = text[:cursor] + CURSOR_MARK + text[cursor:]
+        self.current_input.set(text)
+        
+        # Scroll the display so the cursor stays visible
+        self.display.icursor(cursor)
+        self.display.tk.call('tk::EntrySeeInsert', self.display)
+    
+    def update_preview(self):
+        """Re-evaluate from the first edited character and show the result"""
+        if len(self.input) > PREVIEW_LIMIT:
+            self.evaluator.rewind(0)
+            self.preview_text.set("")
+            return
+        changed = min(self.input.take_changed(), len(self.evaluator))
+        self.evaluator.rewind(changed)
+        self.evaluator.feed(self.input[changed:])
+        result = self.evaluator.preview()
+        self.preview_text.set(f"= {window(result, 0, DISPLAY_WINDOW)[0]}" if result is not None else "")
+    
+    def measure(self, stage, function, *args):
+        """Call function, timing it as stage when metrics are being collected"""
+        if self.metrics is None:
+            return function(*args)
+        start = time.perf_counter()
         try:
-            # Replace × with * and ÷ with / for evaluation
-            expression = expression.replace('×', '*').replace('÷', '/')
-            
-            # Validate expression
-            if not re.match(r'^[\d+\-*/. ]+$', expression):
-                raise ValueError("Invalid characters in expression")
-            
-            # Evaluate safely
-            result = eval(expression, {'__builtins__': None}, {})
-            
-            # Check if result is finite (not inf or nan)
-            if not isfinite(result):
-                raise ValueError("Result is not finite")
-            
-            # Format result
-            if isinstance(result, float):
-                if result.is_integer():
-                    result = int(result)
-                else:
-                    # Limit to 10 decimal places
-                    result = round(result, 10)
-            
-            # Update display and history
-            self.current_input.set(str(result))
-            self.add_to_history(expression, str(result))
-        except Exception as e:
-            self.current_input.set('Error')
+            return function(*args)
+        finally:
+            self.metrics.observe(stage, time.perf_counter() - start)
+    
+    def record_worker_time(self):
+        """Record the round trip of the job the worker just answered"""
+        if self.metrics is not None:
+            self.metrics.observe('worker', time.perf_counter() - self.submitted)
+    
+    def calculate(self):
+        """Evaluate the expression in the worker process and display result"""
+        self.finish_startup()
+        
+        # Replace × with * and ÷ with / and reuse any cached result
+        expression = self.measure('normalize', normalize, self.input.text())
+        key = cache_key(expression, self.mode, self.precision)
+        result = self.measure('cache', self.cache.get, key)
+        if self.metrics is not None:
+            self.metrics.count('cache_lookups', result='miss' if result is None else 'hit')
+        
+        # Reject malformed or too expensive input without the worker
+        if result is None:
+            result = self.measure('preflight', preflight, expression, self.cost_budget, self.mode,
+                                  self.metrics, self.precision)
+        
+        if result is None:
+            # Give quick calculations a moment before showing progress
+            self.submitted = time.perf_counter()
+            self.worker.submit(expression)
+            result = self.worker.result(FAST_RESULT_TIMEOUT)
+            if result is None:
+                self.pending_expression = expression
+                self.root.after(POLL_INTERVAL, self.poll_result)
+                return
+            self.record_worker_time()
+            self.cache.put(key, result)
+        
+        self.show_result(expression, result)
+    
+    def poll_result(self):
+        """Check the worker for the result of a long calculation"""
+        expression = self.pending_expression
+        if expression is None:
+            return
+        
+        result = self.worker.result()
+        if result is None:
+            self.root.after(POLL_INTERVAL, self.poll_result)
+            return
+        
+        self.pending_expression = None
+        self.record_worker_time()
+        self.cache.put(cache_key(expression, self.mode, self.precision), result)
+        self.show_result(expression, result)
+        self.refresh_display()
+    
+    def cancel_calculation(self):
+        """Stop the calculation in flight and restore its expression"""
+        self.worker.cancel()
+        self.pending_expression = None
+        self.refresh_display()
+    
+    def show_result(self, expression, result):
+        """Display a result and record successful calculations"""
+        self.input.set(result)
+        if result not in {ERROR, TOO_COMPLEX}:
+            self.measure('history', self.add_to_history, expression, result)
     
     def add_to_history(self, expression, result):
         """Add calculation to history"""
-        entry = f"{expression} = {result}"
-        self.history.insert(0, entry)
-        
-        # Keep only last 10 entries
-        if len(self.history) > 10:
-            self.history = self.history[:10]
+        timestamp = time.time()
+        if self.history_store is not None:
+            self.history_store.add(expression, result, timestamp)
+        else:
+            self.history.appendleft(self.format_history(timestamp, expression, result))
         
-        # Update history display
-        self.history_text.config(state=tk.NORMAL)
-        self.history_text.delete(1.0, tk.END)
-        self.history_text.insert(tk.END, '\n'.join(self.history))
-        self.history_text.config(state=tk.DISABLED)
+        # Redraw the visible rows, unless showing a search
+        if self.history_matches is None:
+            self.history_list.refresh()
+    
+    def format_history(self, timestamp, expression, result):
+        """Format one calculation as a line of the history panel"""
+        return f"{expression} = {result}"
+    
+    def history_row_count(self):
+        """Number of lines the history panel can scroll through"""
+        if self.history_matches is not None:
+            return len(self.history_matches)
+        if self.history_store is not None:
+            return len(self.history_store)
+        return len(self.history)
+    
+    def history_rows(self, offset, limit):
+        """Return the history panel lines from offset on, newest first"""
+        if self.history_matches is not None:
+            return self.history_matches[offset:offset + limit]
+        if self.history_store is not None:
+            return [self.format_history(*row) for row in self.history_store.recent(limit, offset)]
+        return list(islice(self.history, offset, offset + limit))
+    
+    def search_history(self, *args):
+        """Show calculations matching the search box, or all of them when it is empty"""
+        text = normalize(self.history_search.get())
+        if not text:
+            self.history_matches = None
+        elif self.history_store is not None:
+            self.history_matches = [self.format_history(*row) for row in self.history_store.search(text)]
+        else:
+            self.history_matches = [entry for entry in self.history
+                                    if entry.startswith(text) or entry.endswith(' = ' + text)]
+        self.history_list.top = 0
+        self.history_list.refresh()
+    
+    def define_variable(self, event=None):
+        """Apply the 'name = formula' in the variable box, recomputing what depends on it"""
+        try:
+            self.worksheet.assign(self.variable_text.get())
+        except ValueError:
+            # Bad syntax or a circular definition; leave it for editing
+            self.root.bell()
+            return
+        self.variable_text.set('')
+        self.variables_list.refresh()
+    
+    def use_variable(self, event):
+        """Insert the value of the double-clicked variable at the cursor"""
+        index = self.variables_list.row_at(event.y)
+        name = self.worksheet.name_at(index) if index is not None else None
+        if name is None or self.pending_expression is not None:
+            return
+        if self.worksheet.values.get(name) is None:
+            self.root.bell()
+            return
+        text = self.worksheet.texts[name]
+        if not text.replace('.', '').isdigit():
+            # Group -3 or 1/3 so the operators around it apply to all of it
+            text = f"({text})"
+        self.flush_typed()
+        self.insert_typed(text)
+        self.refresh_display()
+    
+    def on_close(self):
+        """Persist the result cache and history, stop the worker and close the window"""
+        self.cache.save()
+        if self.worker is not None:
+            self.worker.stop()
+        if self.history_store is not None and not self.shared:
+            self.history_store.close()
+        if self.metrics is not None:
+            self.dump_metrics()
+        self.root.destroy()
+    
+    def dump_metrics(self, event=None):
+        """Write the metrics collected so far to the --metrics-file"""
+        try:
+            self.metrics.dump()
+        except OSError:
+            self.root.bell()
+    
+    def open_table(self):
+        """Open the function table window, or raise it if it is already open"""
+        if self.table_window is not None and self.table_window.exists():
+            self.table_window.lift()
+            return
+        from tablewindow import TableWindow
+        self.table_window = TableWindow(self.root, self.history_font, self.button_font,
+                                        self.theme.options, self.cost_budget)
     
     def toggle_theme(self):
-        """Toggle between dark and light theme"""
-        self.dark_mode = not self.dark_mode
+        """Switch to the next theme"""
+        self.theme_index = (self.theme_index + 1) % len(self.themes)
         self.set_theme()
-        self.theme_btn.config(text="☀️" if self.dark_mode else "🌙")
         self.update_theme_colors()
     
     def update_theme_colors(self):
         """Update all widget colors based on current theme"""
-        # Update root window
-        self.root.config(bg=self.bg_color)
-        
-        # Update display
-        self.display.config(
-            bg=self.display_bg,
-            fg=self.display_fg,
-            readonlybackground=self.display_bg
-        )
-        
-        # Update frames
-        self.display_frame.config(bg=self.bg_color)
-        self.button_frame.config(bg=self.bg_color)
+        # Each widget gets one config call with its role's precomputed options
+        options = self.theme.options
+        for role, widgets in self.themed_widgets.items():
+            role_options = options[role]
+            for widget in widgets:
+                widget.config(**role_options)
         if hasattr(self, 'main_frame'):
-            self.main_frame.config(bg=self.bg_color)
-        
-        # Update history frame
-        self.history_frame.config(bg=self.history_bg)
-        self.history_label.config(bg=self.history_bg, fg=self.history_fg)
-        self.history_text.config(
-            bg=self.history_disabled_bg,
-            fg=self.history_fg
-        )
+            self.main_frame.config(**options['frame'])
+        if self.keypad is not None:
+            self.keypad.apply_theme(options)
+        if self.table_window is not None and self.table_window.exists():
+            self.table_window.apply_theme(options)
         
-        # Update theme button
-        self.theme_btn.config(
-            bg=self.special_bg,
-            fg=self.special_fg,
-            activebackground=self.special_active_bg,
-            activeforeground=self.special_fg
-        )
-        
-        # Update history toggle button
-        self.history_btn.config(
-            bg=self.special_bg,
-            fg=self.special_fg,
-            activebackground=self.special_active_bg,
-            activeforeground=self.special_fg
-        )
-        
-        # Update all calculator buttons
-        for child in self.button_frame.winfo_children():
-            if isinstance(child, tk.Button):
-                text = child.cget('text')
-                child.config(
-                    bg=self.get_button_bg(text),
-                    fg=self.get_button_fg(text),
-                    activebackground=self.get_button_active_bg(text),
-                    activeforeground=self.get_button_fg(text)
-                )
+        # The theme button also shows which way it switches
+        self.theme_btn.config(text="☀️" if self.dark_mode else "🌙", **options['special'])
     
     def toggle_history(self):
         """Toggle history panel visibility"""
@@ -399,25 +786,35 @@ class Calculator:
     
     def handle_keypress(self, event):
         """Handle keyboard input"""
+        if event.widget is self.search_entry or event.widget is self.variable_entry:
+            return
         key = event.char
         keysym = event.keysym
         
-        if key.isdigit() or key in '+-*/.':
-            self.on_button_click(key)
-        elif keysym == 'Return':
+        # Characters are batched so a burst of them redraws once
+        if key in TYPED_CHARACTERS:
+            self.queue_typed(key)
+            return
+        # Anything else applies after the characters typed before it
+        self.flush_typed()
+        if keysym == 'Return':
             self.on_button_click('=')
         elif keysym == 'BackSpace':
             self.on_button_click('⌫')
         elif keysym == 'Escape':
-            self.on_button_click('C')
+            # Escape cancels a running calculation before it clears
+            if self.pending_expression is not None:
+                self.cancel_calculation()
+            else:
+                self.on_button_click('C')
         elif keysym == 'Left':
-            # Move cursor left (not implemented as display is readonly)
-            pass
+            self.move_cursor(-1)
         elif keysym == 'Right':
-            # Move cursor right (not implemented as display is readonly)
-            pass
+            self.move_cursor(1)
+        elif keysym == 'Home':
+            self.move_cursor(-len(self.input))
+        elif keysym == 'End':
+            self.move_cursor(len(self.input))
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    calculator = Calculator(root)
-    root.mainloop()
\ No newline at end of file
+    sys.exit(cli.main(Calculator, started=STARTED))
\ No newline at end of file
@@ -0,0 +1,92 @@
+import os
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Bounded LRU cache of formatted results keyed on normalized expressions"""
+
+    def __init__(self, maxsize=1024, path=None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        """Return the cached value for key and mark it most recently used"""
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entry when full"""
+        entries = self.entries
+        if key in entries:
+            entries.move_to_end(key)
+        entries[key] = value
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Return hit/miss/eviction counters and the current size"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def load(self):
+        """Load entries from the cache file, oldest first"""
+        # json is only needed with a cache file, so it is imported here
+        import json
+        try:
+            with open(self.path, encoding='utf-8') as handle:
+                items = json.load(handle)
+        except (OSError, ValueError):
+            return
+        # A file of the wrong shape is ignored like an unreadable one
+        if not isinstance(items, list):
+            return
+        entries = OrderedDict()
+        for item in items[-self.maxsize:]:
+            if not (isinstance(item, list) and len(item) == 2
+                    and isinstance(item[0], str) and isinstance(item[1], str)):
+                return
+            entries[item[0]] = item[1]
+        self.entries.update(entries)
+
+    def save(self):
+        """Write entries to the cache file, replacing it atomically"""
+        if self.path is None:
+            return
+        import json
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as handle:
+            json.dump(list(self.entries.items()), handle)
+        os.replace(temporary, self.path)
@@ -0,0 +1,241 @@
+import argparse
+import os
+import sys
+import time
+from cache import ResultCache
+from engine import DEFAULT_COST_BUDGET, DEFAULT_PRECISION, FLOAT, MODES
+from batch import DEFAULT_CHUNK_SIZE, run_batch
+from history import HistoryStore
+
+DEFAULT_HISTORY_FILE = os.path.join(os.path.expanduser('~'), '.calculator_history.db')
+
+
+def positive_int(text):
+    """argparse type for counts and sizes that must be at least 1"""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {text!r}") from None
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: {text!r}")
+    return value
+
+
+def build_parser():
+    """Build the command line parser shared by the calculator front-ends"""
+    parser = argparse.ArgumentParser(description="Basic calculator")
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help="evaluate expressions line by line without opening a window"
+    )
+    parser.add_argument(
+        'files',
+        nargs='*',
+        help="files to read in batch mode ('-' or none for stdin)"
+    )
+    parser.add_argument(
+        '--workers',
+        type=positive_int,
+        default=1,
+        help="evaluate batch input on this many processes (default: %(default)s)"
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=positive_int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="bytes of input per parallel or vectorized work unit (default: %(default)s)"
+    )
+    parser.add_argument(
+        '--vectorized',
+        action='store_true',
+        help="evaluate batch rows that share an expression shape as numpy columns"
+    )
+    parser.add_argument(
+        '--cost-budget',
+        type=int,
+        default=DEFAULT_COST_BUDGET,
+        help="refuse expressions estimated to cost more limb operations "
+             "than this; 0 disables the check (default: %(default)s)"
+    )
+    parser.add_argument(
+        '--arithmetic',
+        choices=MODES,
+        default=FLOAT,
+        help="binary floats, or exact results as fractions or decimals "
+             "(default: %(default)s)"
+    )
+    parser.add_argument(
+        '--precision',
+        type=positive_int,
+        default=DEFAULT_PRECISION,
+        help="significant digits of division and powers with --arithmetic "
+             "decimal (default: %(default)s)"
+    )
+    parser.add_argument(
+        '--cache-size',
+        type=positive_int,
+        default=1024,
+        help="maximum number of cached results (default: %(default)s)"
+    )
+    parser.add_argument(
+        '--cache-file',
+        help="persist the result cache to this file between launches"
+    )
+    parser.add_argument(
+        '--history-size',
+        type=positive_int,
+        default=1000,
+        help="calculations kept in memory when there is no history file "
+             "(default: %(default)s)"
+    )
+    parser.add_argument(
+        '--history-file',
+        default=DEFAULT_HISTORY_FILE,
+        help="SQLite database every calculation is saved to; an empty "
+             "string keeps history in memory only (default: %(default)s)"
+    )
+    parser.add_argument(
+        '--theme-file',
+        action='append',
+        default=[],
+        help="JSON theme to add to the theme toggle; may be repeated"
+    )
+    parser.add_argument(
+        '--canvas-keypad',
+        action='store_true',
+        help="draw the keypad on one canvas instead of a button per key"
+    )
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help="keep this process running after its windows close and open "
+             "later launches as new windows in it"
+    )
+    parser.add_argument(
+        '--standalone',
+        action='store_true',
+        help="start a new process even when a daemon is running"
+    )
+    parser.add_argument(
+        '--stop-daemon',
+        action='store_true',
+        help="close the running daemon and its windows"
+    )
+    parser.add_argument(
+        '--socket',
+        help="Unix socket of the daemon (default: calculator-<user>.sock in "
+             "$XDG_RUNTIME_DIR or the temporary directory)"
+    )
+    parser.add_argument(
+        '--metrics-file',
+        help="time each stage of a calculation, count errors by type and write the "
+             "figures here on exit and when F12 is pressed; JSON if the name ends in "
+             ".json, else Prometheus text format"
+    )
+    parser.add_argument(
+        '--startup-profile',
+        action='store_true',
+        help="print import time and time to the first frame on stderr"
+    )
+    return parser
+
+
+def profile_startup(root, started, imported, built):
+    """Report startup timings on stderr once the window is first mapped
+
+    started is taken before the front-end's imports, imported when main()
+    is entered and built after the calculator's constructor returns.
+    """
+    def milliseconds(start, end):
+        return f"{(end - start) * 1000:.1f}ms"
+
+    reported = []
+
+    def on_map(event):
+        if event.widget is root and not reported:
+            mapped = time.perf_counter()
+            reported.append(mapped)
+            # Queued after the calculator's own deferred setup, so this
+            # runs once that is done
+            root.after_idle(report, mapped)
+
+    def report(mapped):
+        done = time.perf_counter()
+        print(f"imports {milliseconds(started, imported)}, "
+              f"widgets {milliseconds(imported, built)}, "
+              f"first frame {milliseconds(started, mapped)}, "
+              f"deferred setup {milliseconds(mapped, done)}", file=sys.stderr)
+
+    root.bind('<Map>', on_map, add='+')
+
+
+def main(calculator_class, argv=None, started=None):
+    """Run a calculator front-end, or batch mode when --batch is given
+
+    started is the time.perf_counter() value the front-end took before
+    its imports; --startup-profile measures from it.
+    """
+    imported = time.perf_counter()
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    metrics = None
+    if args.metrics_file:
+        from metrics import Metrics
+        metrics = Metrics(args.metrics_file)
+
+    if args.batch:
+        cache = ResultCache(args.cache_size, args.cache_file)
+        status = run_batch(args.files, cache=cache, workers=args.workers,
+                           chunk_size=args.chunk_size, vectorized=args.vectorized,
+                           budget=args.cost_budget, mode=args.arithmetic,
+                           precision=args.precision, metrics=metrics)
+        if metrics is not None:
+            metrics.dump()
+        return status
+    if args.files:
+        parser.error("input files are only used with --batch")
+
+    import daemon
+    socket_path = args.socket or daemon.default_socket_path()
+    if args.stop_daemon:
+        if daemon.request(socket_path, {'command': 'quit'}) is None:
+            print("no calculator daemon is running", file=sys.stderr)
+            return 1
+        return 0
+    if not args.standalone:
+        # A running daemon opens the window, which skips Tk startup here
+        reply = daemon.request(socket_path, {
+            'command': 'open',
+            'theme_files': [os.path.abspath(path) for path in args.theme_file],
+            'canvas_keypad': args.canvas_keypad,
+        })
+        if reply is not None:
+            if reply.get('status') != 'ok':
+                print(f"calculator daemon: {reply.get('error')}", file=sys.stderr)
+                return 1
+            return 0
+
+    import tkinter as tk
+    root = tk.Tk()
+    cache = ResultCache(args.cache_size, args.cache_file)
+    # Opened by the calculator once its window is on screen
+    history_store = HistoryStore(args.history_file, deferred=True) if args.history_file else None
+    if args.daemon:
+        server = daemon.CalculatorDaemon(root, calculator_class, socket_path, cache, history_store,
+                                         cost_budget=args.cost_budget,
+                                         mode=args.arithmetic, precision=args.precision,
+                                         history_size=args.history_size, metrics=metrics)
+        server.open_window(args.theme_file, args.canvas_keypad)
+        root.mainloop()
+        return 0
+    calculator_class(root, cache=cache, cost_budget=args.cost_budget,
+                     mode=args.arithmetic, precision=args.precision,
+                     history_size=args.history_size, history_store=history_store,
+                     theme_files=args.theme_file, canvas_keypad=args.canvas_keypad,
+                     metrics=metrics)
+    if args.startup_profile:
+        profile_startup(root, started if started is not None else imported,
+                        imported, time.perf_counter())
+    root.mainloop()
+    return 0
@@ -0,0 +1,139 @@
+import getpass
+import json
+import os
+import socket
+import tkinter as tk
+
+# Seconds a client waits for the daemon to open its window
+REQUEST_TIMEOUT = 5.0
+
+
+def default_socket_path():
+    """Per-user socket path, in the runtime directory when there is one"""
+    directory = os.environ.get('XDG_RUNTIME_DIR') or os.environ.get('TMPDIR') or '/tmp'
+    return os.path.join(directory, f'calculator-{getpass.getuser()}.sock')
+
+
+def request(path, message, timeout=REQUEST_TIMEOUT):
+    """Send one request to a running daemon and return its reply
+
+    Returns None when no daemon is listening on path, so callers can
+    fall back to starting one of their own.
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(timeout)
+            connection.connect(path)
+            connection.sendall(json.dumps(message).encode('utf-8') + b'\n')
+            with connection.makefile('rb') as reader:
+                reply = reader.readline()
+    except OSError:
+        return None
+    try:
+        return json.loads(reply)
+    except ValueError:
+        return None
+
+
+def listen(path):
+    """Bind a listening socket at path that only the current user can connect to"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen()
+    return server
+
+
+class CalculatorDaemon:
+    """Opens calculator windows on request from one resident Tk interpreter
+
+    Later launches connect to a Unix domain socket and ask for a window
+    instead of starting an interpreter and Tk of their own. Every window
+    is a Toplevel of the same hidden root and shares its result cache and
+    history store; each keeps its own worker process, so cancelling a
+    calculation in one window cannot kill another's.
+    """
+
+    def __init__(self, root, calculator_class, path, cache, history_store=None, **options):
+        self.root = root
+        self.calculator_class = calculator_class
+        self.path = path
+        self.cache = cache
+        self.history_store = history_store
+        # Passed to every Calculator, e.g. cost_budget and history_size
+        self.options = options
+        self.calculators = []
+        self.server = listen(path)
+        self.root.withdraw()
+        self.root.tk.createfilehandler(self.server, tk.READABLE, self.accept)
+
+    def accept(self, server, mask):
+        """Answer one client; called by Tk when the socket is readable"""
+        connection, _ = self.server.accept()
+        with connection:
+            connection.settimeout(REQUEST_TIMEOUT)
+            try:
+                with connection.makefile('rb') as reader:
+                    message = json.loads(reader.readline())
+                reply = self.handle(message)
+                connection.sendall(json.dumps(reply).encode('utf-8') + b'\n')
+            except (OSError, ValueError):
+                # A client that went away or sent garbage gets nothing
+                return
+
+    def handle(self, message):
+        """Carry out a request and return the reply to send back"""
+        command = message.get('command') if isinstance(message, dict) else None
+        if command == 'open':
+            try:
+                self.open_window(message.get('theme_files', ()), message.get('canvas_keypad', False))
+            except Exception as error:
+                # e.g. a bad theme file; report it rather than stop serving
+                return {'status': 'error', 'error': str(error)}
+            return {'status': 'ok'}
+        if command == 'quit':
+            self.root.after_idle(self.shutdown)
+            return {'status': 'ok'}
+        return {'status': 'error', 'error': f"unknown command {command!r}"}
+
+    def open_window(self, theme_files=(), canvas_keypad=False):
+        """Open a new calculator window sharing the daemon's cache and history"""
+        self.calculators = [calculator for calculator in self.calculators
+                            if calculator.root.winfo_exists()]
+        window = tk.Toplevel(self.root)
+        try:
+            calculator = self.calculator_class(
+                window, cache=self.cache, history_store=self.history_store, shared=True,
+                theme_files=theme_files, canvas_keypad=canvas_keypad, **self.options)
+        except BaseException:
+            window.destroy()
+            raise
+        self.calculators.append(calculator)
+        window.lift()
+        window.focus_force()
+        return calculator
+
+    def shutdown(self):
+        """Stop listening, close every window and leave the main loop"""
+        self.root.tk.deletefilehandler(self.server)
+        self.server.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        for calculator in self.calculators:
+            if calculator.root.winfo_exists():
+                calculator.on_close()
+        self.cache.save()
+        if self.history_store is not None:
+            self.history_store.close()
+        self.root.destroy()
@@ -0,0 +1,437 @@
+import operator
+from math import isfinite, log10
+from time import perf_counter
+from bigint import SMALL_DIGITS, decimal_to_int, int_to_decimal
+
+# Anything that is not a number or an operator falls through to the last
+# alternative so it can be reported; numbers are ASCII-only, like Python's.
+# Names are single tokens, which only worksheet formulas accept; elsewhere
+# they fail to parse like any other unknown token
+TOKEN_REGEX = r'[0-9]+\.?[0-9]*|\.[0-9]+|[A-Za-z_][A-Za-z0-9_]*|\*\*|//|[-+*/]|[^ ]'
+
+# Compiled by tokenize() on first use, so importing the engine is cheap
+token_pattern = None
+
+# The exact module, imported by exact_arithmetic() when first needed
+exact_module = None
+
+DIGITS = frozenset('0123456789')
+LEADING_DIGITS = frozenset('123456789')
+
+# Same binding strength as Python: unary signs bind tighter than * and /,
+# but looser than the right-associative ** on their right
+BINARY_OPERATORS = {
+    '+': (1, operator.add),
+    '-': (1, operator.sub),
+    '*': (2, operator.mul),
+    '/': (2, operator.truediv),
+    '//': (2, operator.floordiv),
+    '**': (4, operator.pow),
+}
+
+UNARY_OPERATORS = {
+    '-': operator.neg,
+    '+': operator.pos,
+}
+
+UNARY_PRECEDENCE = 3
+POWER_PRECEDENCE = 4
+# An open parenthesis waits on the operator stack with this precedence,
+# which no operator reduces past
+GROUP_PRECEDENCE = 0
+
+ERROR = 'Error'
+TOO_COMPLEX = 'Too complex'
+
+# Arithmetic modes: binary floats, or exact rationals (see exact.py)
+FLOAT = 'float'
+FRACTION = 'fraction'
+DECIMAL = 'decimal'
+MODES = (FLOAT, FRACTION, DECIMAL)
+# Significant digits of division and powers in decimal mode
+DEFAULT_PRECISION = 28
+
+# Preflight budget in limb operations; one is roughly 5-10ns of CPython
+# big-integer work, so the default bounds a calculation near 0.1s
+DEFAULT_COST_BUDGET = 10 ** 7
+
+# Decimal digits held by one 30-bit CPython integer limb
+LIMB_DIGITS = 9.03
+LOG10_2 = 0.30103
+KARATSUBA_EXPONENT = 1.585
+# Sizes (in digits) beyond any budget, as far as estimate_cost is concerned
+MAX_SIZE = 1e30
+# Limb operations per cubed limb of precision for a decimal power with a
+# fractional exponent; measured against libmpdec's exp and ln
+FRACTIONAL_POWER_COST = 1.5
+
+# Kinds of value estimate_cost tracks: plain integers, binary floats, and
+# exact fractions or decimals that are not whole
+INTEGER_VALUE = 'integer'
+FLOAT_VALUE = 'float'
+EXACT_VALUE = 'exact'
+
+UNARY_FUNCTIONS = frozenset(UNARY_OPERATORS.values())
+FUNCTION_TYPE = type(operator.add)
+
+
+def parse_number(token):
+    """Convert a numeric literal the way the Python compiler would"""
+    if '.' in token:
+        return float(token)
+    if token[0] not in DIGITS:
+        raise ValueError("Invalid characters in expression")
+    if token[0] == '0' and token.strip('0'):
+        raise ValueError("Leading zeros in decimal integer literals are not permitted")
+    return decimal_to_int(token)
+
+
+def tokenize(expression):
+    """Split an expression into number, operator and unknown tokens"""
+    global token_pattern
+    if token_pattern is None:
+        import re
+        token_pattern = re.compile(TOKEN_REGEX)
+    return token_pattern.findall(expression)
+
+
+def exact_arithmetic():
+    """Return the exact module, which implements the FRACTION and DECIMAL modes"""
+    global exact_module
+    if exact_module is None:
+        import exact
+        exact_module = exact
+    return exact_module
+
+
+def compile_expression(expression, parse=parse_number):
+    """Compile an expression into a flat postfix program
+
+    The program is a tuple of numbers and operator functions; unary
+    operators are the functions in UNARY_FUNCTIONS, all others take two
+    operands. Plain integer literals become ints, every other literal
+    is converted by parse. Parentheses only group, so they leave nothing
+    in the program; unbalanced ones raise ValueError.
+    """
+    program = []
+    emit = program.append
+    operators = []
+    precedences = []
+    expect_operand = True
+    for token in tokenize(expression):
+        binary = BINARY_OPERATORS.get(token)
+        if binary is None:
+            if token == '(':
+                if not expect_operand:
+                    raise ValueError("Missing operator before parenthesis")
+                precedences.append(GROUP_PRECEDENCE)
+                operators.append(None)
+                continue
+            if token == ')':
+                if expect_operand:
+                    raise ValueError("Incomplete expression")
+                while operators and operators[-1] is not None:
+                    precedences.pop()
+                    emit(operators.pop())
+                if not operators:
+                    raise ValueError("Unbalanced parentheses")
+                precedences.pop()
+                operators.pop()
+                continue
+            if not expect_operand:
+                raise ValueError("Missing operator between numbers")
+            if token[0] in LEADING_DIGITS and '.' not in token and len(token) <= SMALL_DIGITS:
+                emit(int(token))
+            else:
+                emit(parse(token))
+            expect_operand = False
+        elif expect_operand:
+            function = UNARY_OPERATORS.get(token)
+            if function is None:
+                raise ValueError("Operator without left operand")
+            # Prefix operators never reduce what is already pending
+            precedences.append(UNARY_PRECEDENCE)
+            operators.append(function)
+        else:
+            precedence, function = binary
+            # ** is right-associative and its left operand is a literal
+            # or a closed group, so nothing pending can bind tighter
+            if precedence != POWER_PRECEDENCE:
+                while precedences and precedences[-1] >= precedence:
+                    precedences.pop()
+                    emit(operators.pop())
+            precedences.append(precedence)
+            operators.append(function)
+            expect_operand = True
+    if expect_operand:
+        raise ValueError("Incomplete expression")
+    while operators:
+        function = operators.pop()
+        if function is None:
+            raise ValueError("Unbalanced parentheses")
+        emit(function)
+    return tuple(program)
+
+
+def run(program):
+    """Execute a compiled postfix program and return its value"""
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    unary = UNARY_FUNCTIONS
+    for item in program:
+        if item.__class__ is FUNCTION_TYPE:
+            if item in unary:
+                push(item(pop()))
+            else:
+                right = pop()
+                push(item(pop(), right))
+        else:
+            push(item)
+    return stack[0]
+
+
+def estimate_cost(program, exact=False, precision=None):
+    """Estimate the cost of running a program in limb operations
+
+    A single linear pass tracks the approximate size (log10 of the
+    magnitude), sign and kind of every intermediate value, which is
+    enough to bound big-integer arithmetic. Float arithmetic counts as
+    constant. With exact set the program is one from
+    exact.compile_exact, whose decimal literals are (mantissa, scale)
+    pairs, and division and negative powers grow their results like
+    multiplication does; a literal is sized by its denominator as well
+    as its mantissa. precision is given in DECIMAL mode, where division
+    and powers that are not plain integer ones are rounded to that many
+    digits: they are charged by it, and a power with a fractional
+    exponent about cubically so.
+    """
+    # Entries are (log10 magnitude, sign or 0 if unknown, kind)
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    cost = 0.0
+    precision_limbs = precision / LIMB_DIGITS + 1 if precision else 0.0
+    for item in program:
+        if item.__class__ is not FUNCTION_TYPE:
+            if item.__class__ is float:
+                push((0.0, 1, FLOAT_VALUE))
+                continue
+            if item.__class__ is tuple:
+                # An exact decimal literal carries its 10**scale denominator
+                # through every operation, so it is at least scale digits
+                mantissa, scale = item
+                size = log10(mantissa) if mantissa > 0 else 0.0
+                push((max(size, scale), 1, EXACT_VALUE if scale else INTEGER_VALUE))
+                continue
+            # Exactly, not rounded down to a power of two: the size of an
+            # exponent is itself exponentiated, so 10**7**10 would pass.
+            # Literals are never negative, but worksheet values and the x
+            # of a sweep are put into programs as they are
+            if item > 0:
+                push((log10(item), 1, INTEGER_VALUE))
+            elif item < 0:
+                push((log10(-item), -1, INTEGER_VALUE))
+            else:
+                push((0.0, 1, INTEGER_VALUE))
+            continue
+        if item in UNARY_FUNCTIONS:
+            size, sign, kind = pop()
+            push((size, -sign if item is operator.neg else sign, kind))
+            continue
+        right_size, right_sign, right_kind = pop()
+        left_size, left_sign, left_kind = pop()
+        if (left_kind is FLOAT_VALUE or right_kind is FLOAT_VALUE
+                or (item is operator.truediv and not exact)):
+            cost += 1 + (left_size + right_size) / LIMB_DIGITS
+            push((0.0, 0, FLOAT_VALUE))
+            continue
+        kind = EXACT_VALUE if EXACT_VALUE in (left_kind, right_kind) else INTEGER_VALUE
+        left_limbs = left_size / LIMB_DIGITS + 1
+        right_limbs = right_size / LIMB_DIGITS + 1
+        if item is operator.add or item is operator.sub:
+            cost += max(left_limbs, right_limbs)
+            # The sum of magnitudes, not a digit more per term: a long sum
+            # of small numbers stays small
+            small, large = sorted((left_size, right_size))
+            push((large + log10(1 + 10.0 ** (small - large)), 0, kind))
+        elif item is operator.mul or item is operator.truediv:
+            small, large = sorted((left_limbs, right_limbs))
+            cost += large * small ** (KARATSUBA_EXPONENT - 1)
+            if item is operator.truediv:
+                kind = EXACT_VALUE
+                if precision:
+                    # Rounded division at the precision
+                    cost += max(large, precision_limbs) ** KARATSUBA_EXPONENT
+            push((left_size + right_size, left_sign * right_sign, kind))
+        elif item is operator.floordiv:
+            size = left_size - right_size if left_size > right_size else 0.0
+            cost += (size / LIMB_DIGITS + 1) * right_limbs
+            push((size, left_sign * right_sign, kind))
+        elif right_sign < 0 and not exact:
+            # int ** negative int is computed in floating point
+            cost += 1
+            push((0.0, 0, FLOAT_VALUE))
+        else:
+            if precision and right_kind is EXACT_VALUE:
+                # A fractional exponent goes through exp and ln at the precision
+                cost += FRACTIONAL_POWER_COST * precision_limbs ** 3
+            elif precision and (kind is EXACT_VALUE or right_sign < 0):
+                # Squarings rounded to the precision, one per exponent bit
+                cost += (right_size / LOG10_2 + 1) * precision_limbs ** KARATSUBA_EXPONENT
+            if right_sign < 0:
+                kind = EXACT_VALUE
+            # Repeated squaring is dominated by the last multiplication
+            exponent = 10.0 ** min(right_size, 308.0)
+            # Capped so that costing towers of powers cannot overflow
+            size = min(left_size * exponent, MAX_SIZE)
+            cost += right_size / LOG10_2 + (size / LIMB_DIGITS + 1) ** KARATSUBA_EXPONENT
+            push((size, left_sign if left_sign > 0 else 0, kind))
+    size, _, kind = stack[0]
+    if kind is not FLOAT_VALUE:
+        # Printing an integer result costs about one multiplication at its size
+        cost += (size / LIMB_DIGITS + 1) ** KARATSUBA_EXPONENT
+    return cost
+
+
+def cost_precision(mode, precision):
+    """Return the precision estimate_cost should charge for, which only DECIMAL rounds to"""
+    return precision if mode == DECIMAL else None
+
+
+def preflight(expression, budget=DEFAULT_COST_BUDGET, mode=FLOAT, metrics=None,
+              precision=DEFAULT_PRECISION):
+    """Return ERROR or TOO_COMPLEX if an expression should not be run, else None
+
+    This only compiles and estimates, so it is cheap enough to run on the
+    UI thread before handing work to a worker. Rejected input is counted
+    by exception type when a Metrics is given.
+    """
+    try:
+        if mode == FLOAT:
+            program = compile_expression(expression)
+        else:
+            program = exact_arithmetic().compile_exact(expression)
+    except Exception as error:
+        if metrics is not None:
+            metrics.count('errors', stage='preflight', type=type(error).__name__)
+        return ERROR
+    if budget and estimate_cost(program, mode != FLOAT, cost_precision(mode, precision)) > budget:
+        return TOO_COMPLEX
+    return None
+
+
+def evaluate(expression):
+    """Evaluate an arithmetic expression without going through compile()"""
+    return run(compile_expression(expression))
+
+
+def format_result(result):
+    """Format a numeric result for the display"""
+    if result.__class__ is int:
+        return int_to_decimal(result)
+    if not isfinite(result):
+        raise ValueError("Result is not finite")
+    if isinstance(result, float):
+        if result.is_integer():
+            result = int(result)
+        else:
+            result = round(result, 10)
+    return str(result)
+
+
+def normalize(expression):
+    """Map display symbols to operators and strip surrounding whitespace"""
+    return expression.replace('×', '*').replace('÷', '/').strip()
+
+
+def cache_key(expression, mode=FLOAT, precision=DEFAULT_PRECISION):
+    """Return the result cache key of an expression in an arithmetic mode"""
+    if mode == FLOAT:
+        return expression
+    return f"{mode}:{precision}:{expression}"
+
+
+def calculate(expression, cache=None, budget=DEFAULT_COST_BUDGET, mode=FLOAT,
+              precision=DEFAULT_PRECISION, metrics=None):
+    """Return the display text for a normalized expression
+
+    Failures are reported as ERROR rather than raised, and expressions
+    estimated to cost more than budget as TOO_COMPLEX (a falsy budget
+    disables the check). When a ResultCache is given, results are looked
+    up and stored in it. mode is one of MODES; precision only applies to
+    DECIMAL. When a Metrics is given, the work goes through
+    calculate_measured() instead.
+    """
+    if metrics is not None:
+        return calculate_measured(expression, cache, budget, mode, precision, metrics)
+    if cache is not None:
+        key = cache_key(expression, mode, precision)
+        result = cache.get(key)
+        if result is not None:
+            return result
+    try:
+        if mode == FLOAT:
+            program = compile_expression(expression)
+        else:
+            program = exact_arithmetic().compile_exact(expression)
+        if budget and estimate_cost(program, mode != FLOAT, cost_precision(mode, precision)) > budget:
+            result = TOO_COMPLEX
+        elif mode == FLOAT:
+            result = format_result(run(program))
+        else:
+            result = exact_module.evaluate_exact(program, mode, precision)
+    except Exception:
+        result = ERROR
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+
+def calculate_measured(expression, cache, budget, mode, precision, metrics):
+    """calculate(), timing each stage and counting failures by stage and type in metrics
+
+    In exact modes the 'evaluate' stage includes formatting, which
+    evaluate_exact() does as it goes.
+    """
+    if cache is not None:
+        key = cache_key(expression, mode, precision)
+        result = cache.get(key)
+        metrics.count('cache_lookups', result='miss' if result is None else 'hit')
+        if result is not None:
+            return result
+    stage = 'compile'
+    start = perf_counter()
+    try:
+        if mode == FLOAT:
+            program = compile_expression(expression)
+        else:
+            program = exact_arithmetic().compile_exact(expression)
+        now = perf_counter()
+        metrics.observe(stage, now - start)
+        stage, start = 'estimate', now
+        too_complex = budget and estimate_cost(program, mode != FLOAT,
+                                               cost_precision(mode, precision)) > budget
+        now = perf_counter()
+        metrics.observe(stage, now - start)
+        stage, start = 'evaluate', now
+        if too_complex:
+            result = TOO_COMPLEX
+        elif mode == FLOAT:
+            value = run(program)
+            now = perf_counter()
+            metrics.observe(stage, now - start)
+            stage, start = 'format', now
+            result = format_result(value)
+            metrics.observe(stage, perf_counter() - start)
+        else:
+            result = exact_module.evaluate_exact(program, mode, precision)
+            metrics.observe(stage, perf_counter() - start)
+    except Exception as error:
+        metrics.count('errors', stage=stage, type=type(error).__name__)
+        result = ERROR
+    outcome = 'error' if result is ERROR else 'too_complex' if result is TOO_COMPLEX else 'ok'
+    metrics.count('calculations', outcome=outcome)
+    if cache is not None:
+        cache.put(key, result)
+    return result
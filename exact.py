@@ -0,0 +1,276 @@
+import decimal
+import operator
+from fractions import Fraction
+from bigint import decimal_to_int, int_to_decimal
+from engine import (
+    DECIMAL,
+    FRACTION,
+    FUNCTION_TYPE,
+    UNARY_FUNCTIONS,
+    compile_expression,
+    format_result,
+    parse_number,
+    run,
+)
+
+# Operators that keep fixed-point operands fixed-point
+FIXED_OPERATORS = frozenset({operator.add, operator.sub, operator.mul, operator.neg, operator.pos})
+
+LOG2_5 = 2.321928094887362
+
+# Addition, subtraction and multiplication in decimal mode never round
+UNBOUNDED = decimal.Context(prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+
+
+def parse_fixed(token):
+    """Parse a literal exactly: an int, or (mantissa, scale) meaning mantissa / 10**scale"""
+    if '.' not in token:
+        return parse_number(token)
+    # The tokenizer only lets through digits around the point, and a
+    # lone '.' fails in int('')
+    whole, _, fraction = token.partition('.')
+    return decimal_to_int(whole + fraction), len(fraction)
+
+
+def compile_exact(expression):
+    """Compile an expression like compile_expression, keeping decimal literals exact"""
+    return compile_expression(expression, parse_fixed)
+
+
+def run_fixed(program):
+    """Run a program of + - * and signs on (mantissa, scale) pairs
+
+    This is the whole of exact arithmetic when nothing divides: values
+    stay scaled integers, and only additions of different scales need a
+    multiplication by a power of ten.
+    """
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    for item in program:
+        if item.__class__ is FUNCTION_TYPE:
+            if item in UNARY_FUNCTIONS:
+                mantissa, scale = pop()
+                push((item(mantissa), scale))
+                continue
+            right, right_scale = pop()
+            left, left_scale = pop()
+            if item is operator.mul:
+                push((left * right, left_scale + right_scale))
+            elif left_scale < right_scale:
+                push((item(left * 10 ** (right_scale - left_scale), right), right_scale))
+            elif left_scale > right_scale:
+                push((item(left, right * 10 ** (left_scale - right_scale)), left_scale))
+            else:
+                push((item(left, right), left_scale))
+        elif item.__class__ is int:
+            push((item, 0))
+        else:
+            push(item)
+    return stack[0]
+
+
+def format_fixed(mantissa, scale):
+    """Format mantissa / 10**scale as a decimal without trailing zeros"""
+    text = int_to_decimal(abs(mantissa))
+    if scale:
+        text = text.rjust(scale + 1, '0')
+        fraction = text[-scale:].rstrip('0')
+        text = text[:-scale] + '.' + fraction if fraction else text[:-scale]
+    return '-' + text if mantissa < 0 else text
+
+
+def format_fraction(value):
+    """Format a Fraction exactly: as a decimal when it terminates, else as n/d"""
+    numerator = value.numerator
+    denominator = value.denominator
+    if denominator == 1:
+        return int_to_decimal(numerator)
+    # Only denominators of the form 2**a * 5**b give terminating decimals
+    twos = (denominator & -denominator).bit_length() - 1
+    rest = denominator >> twos
+    fives = round((rest.bit_length() - 1) / LOG2_5)
+    if rest != 5 ** fives:
+        return f"{int_to_decimal(numerator)}/{int_to_decimal(denominator)}"
+    scale = max(twos, fives)
+    return format_fixed(numerator * (10 ** scale // denominator), scale)
+
+
+def format_decimal(value):
+    """Format a Decimal in positional notation without trailing zeros"""
+    text = format(value, 'f')
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+
+def format_exact(value):
+    """Format the result of an exact program for the display"""
+    if value.__class__ is int:
+        return int_to_decimal(value)
+    if value.__class__ is Fraction:
+        return format_fraction(value)
+    if value.__class__ is decimal.Decimal:
+        return format_decimal(value)
+    # A power with a non-integer exponent, which is rarely rational
+    return format_result(value)
+
+
+def parse_fixed_fraction(token):
+    """Parse an unsigned integer or decimal literal as a Fraction"""
+    if not token:
+        raise ValueError("Empty number")
+    literal = parse_fixed(token)
+    if literal.__class__ is int:
+        return Fraction(literal)
+    return fraction_literal(*literal)
+
+
+def parse_result(text):
+    """Parse a displayed result of any mode exactly, as a Fraction
+
+    Accepts what format_exact and format_result produce: integers and
+    decimals of any length, n/d, and the exponent form of a float.
+    Raises ValueError for anything else.
+    """
+    negative = text[:1] == '-'
+    numerator, slash, denominator = text[negative:].partition('/')
+    if 'e' in numerator:
+        value = Fraction(numerator)
+    else:
+        value = parse_fixed_fraction(numerator)
+    if slash:
+        value /= parse_fixed_fraction(denominator)
+    return -value if negative else value
+
+
+def format_in_mode(value, mode, precision):
+    """Format a Fraction the way a result of mode is displayed"""
+    if value.denominator == 1:
+        return int_to_decimal(value.numerator)
+    if mode == FRACTION:
+        return format_fraction(value)
+    if mode == DECIMAL:
+        return format_decimal(rounding_context(precision).divide(
+            decimal.Decimal(value.numerator), decimal.Decimal(value.denominator)))
+    return format_result(value.numerator / value.denominator)
+
+
+def fraction_divide(left, right):
+    """left / right as a Fraction, unless a float already made it inexact"""
+    if left.__class__ is float or right.__class__ is float:
+        return left / right
+    return Fraction(left, right)
+
+
+def fraction_power(base, exponent):
+    """base ** exponent, exact for integer exponents"""
+    if exponent.__class__ is int and exponent < 0 and base.__class__ is int:
+        return Fraction(base) ** exponent
+    return base ** exponent
+
+
+def decimal_floor_divide(left, right):
+    """left // right rounded down like Python's, not towards zero like Decimal's"""
+    quotient = left // right
+    if quotient.__class__ is decimal.Decimal:
+        remainder = left % right
+        if remainder and (remainder < 0) != (right < 0):
+            quotient -= 1
+    return quotient
+
+
+def fraction_literal(mantissa, scale):
+    """Convert a fixed-point literal to a Fraction"""
+    return Fraction(mantissa, 10 ** scale)
+
+
+def decimal_literal(mantissa, scale):
+    """Convert a fixed-point literal to a Decimal"""
+    return decimal.Decimal(mantissa).scaleb(-scale, UNBOUNDED)
+
+
+def run_with(program, literal, replacements):
+    """Run a program like run(), converting fixed-point literals with literal
+    and calling replacements in place of the binary operators they map
+    """
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    for item in program:
+        if item.__class__ is FUNCTION_TYPE:
+            if item in UNARY_FUNCTIONS:
+                push(item(pop()))
+            else:
+                right = pop()
+                push(replacements.get(item, item)(pop(), right))
+        elif item.__class__ is tuple:
+            push(literal(*item))
+        else:
+            push(item)
+    return stack[0]
+
+
+def run_fraction(program):
+    """Run a program from compile_exact on Fractions"""
+    replacements = {operator.truediv: fraction_divide, operator.pow: fraction_power}
+    return run_with(program, fraction_literal, replacements)
+
+
+def rounding_context(precision):
+    """Return a Context rounding to precision significant digits
+
+    The exponent range is unbounded like UNBOUNDED's, so tiny and huge
+    results are not flushed to zero or refused as overflowing.
+    """
+    return decimal.Context(prec=precision, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+
+
+def run_decimal(program, precision):
+    """Run a program from compile_exact on Decimals
+
+    Division and powers round to precision significant digits; the rest
+    is exact.
+    """
+    rounded = rounding_context(precision)
+
+    def power(base, exponent):
+        if base.__class__ is int and exponent.__class__ is int and exponent >= 0:
+            return base ** exponent
+        return rounded.power(base, exponent)
+
+    replacements = {
+        operator.truediv: rounded.divide,
+        operator.floordiv: decimal_floor_divide,
+        operator.pow: power,
+    }
+    with decimal.localcontext(UNBOUNDED):
+        return run_with(program, decimal_literal, replacements)
+
+
+def evaluate_exact(program, mode, precision):
+    """Run a program from compile_exact and return its display text
+
+    Integer-only programs without division run as they are, and
+    fixed-point programs with only + - * run on scaled integers; only
+    the rest pay for Fraction or Decimal arithmetic.
+    """
+    integer = fixed = True
+    for item in program:
+        if item.__class__ is FUNCTION_TYPE:
+            if item not in FIXED_OPERATORS:
+                fixed = False
+                if item is operator.truediv:
+                    integer = False
+        elif item.__class__ is tuple:
+            integer = False
+    if integer:
+        result = run(program)
+        # Otherwise a negative power made a float; redo it exactly
+        if result.__class__ is int:
+            return int_to_decimal(result)
+    elif fixed:
+        return format_fixed(*run_fixed(program))
+    if mode == FRACTION:
+        return format_exact(run_fraction(program))
+    return format_exact(run_decimal(program, precision))
@@ -0,0 +1,231 @@
+import queue
+import threading
+import time
+from collections import deque
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS history (
+        id INTEGER PRIMARY KEY,
+        timestamp REAL NOT NULL,
+        expression TEXT NOT NULL,
+        result TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp)",
+    "CREATE INDEX IF NOT EXISTS history_expression ON history (expression)",
+    "CREATE INDEX IF NOT EXISTS history_result ON history (result)",
+)
+
+# Sorts after every character, so prefix + PREFIX_END bounds a prefix range
+PREFIX_END = '\U0010ffff'
+
+# A search matching at least this many rows walks the timestamp index
+# instead, since it reaches the newest matches sooner than sorting them all
+DENSE_MATCHES = 5000
+
+MATCH = "(expression >= ? AND expression < ?) OR result = ?"
+
+CLEAR = 'clear'
+STOP = 'stop'
+
+
+class HistoryStore:
+    """Calculation history persisted to SQLite by a background writer
+
+    add() only queues a row. A writer thread commits queued rows in
+    batches of up to batch_size, waiting flush_interval seconds after the
+    first one so that bursts share a transaction. The database runs in
+    WAL mode with synchronous=NORMAL, so commits do not fsync and readers
+    on the UI thread are never blocked by the writer.
+
+    Rows are only ever deleted all at once, so ids run from 1 to the
+    number of committed rows and the row n places from the newest is
+    found by id. That holds with several stores on one file too, as when
+    two calculators are started without the daemon: SQLite gives every
+    insert the next id whichever process makes it. Rows still queued are
+    kept in pending, so readers see them before they are committed.
+
+    The lock guards pending and the newest committed id. The writer takes
+    it after a transaction has committed to move the batch from one to
+    the other, never around its SQL, so add(), len() and recent() do not
+    wait on disk I/O. While nothing of this store's is in flight, readers
+    take the newest id from the database instead, which brings in rows
+    other processes have added.
+    """
+
+    def __init__(self, path, flush_interval=0.5, batch_size=256, deferred=False):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.connection = None
+        self.queue = queue.Queue()
+        # Guards pending and count, which readers take together
+        self.lock = threading.Lock()
+        self.pending = deque()
+        # Newest committed id, which is also the number of committed rows
+        self.count = 0
+        # Number of queued clear() calls; committed rows are hidden until they run
+        self.clears = 0
+        self.writer = threading.Thread(target=self.write_loop, name="history-writer", daemon=True)
+        if not deferred:
+            self.start()
+
+    def start(self):
+        """Open the database and start the writer, unless already done
+
+        A store created with deferred=True does nothing until this is
+        called, so it costs nothing before the window is on screen.
+        """
+        if self.connection is not None:
+            return
+        self.connection = self.connect()
+        with self.connection:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+        self.count = self.newest_id(self.connection)
+        self.writer.start()
+
+    def connect(self):
+        """Open a connection to the database in WAL mode"""
+        import sqlite3
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def add(self, expression, result, timestamp=None):
+        """Queue a calculation to be written"""
+        row = (time.time() if timestamp is None else timestamp, expression, result)
+        with self.lock:
+            self.pending.append(row)
+        self.queue.put(row)
+
+    def clear(self):
+        """Delete all history, including rows already queued"""
+        with self.lock:
+            self.pending.clear()
+            self.clears += 1
+            self.queue.put(CLEAR)
+
+    def flush(self):
+        """Wait until everything queued so far has been committed"""
+        self.queue.join()
+
+    def close(self):
+        """Commit what is queued, stop the writer and close the database"""
+        if self.connection is None:
+            return
+        if self.writer.is_alive():
+            self.queue.put(STOP)
+            self.writer.join()
+        self.connection.close()
+
+    def write_loop(self):
+        """Commit queued rows in batches until close() is called"""
+        connection = self.connect()
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            if batch[0] is not STOP:
+                time.sleep(self.flush_interval)
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = []
+            cleared = 0
+            with connection:
+                for item in batch:
+                    if item is STOP:
+                        running = False
+                    elif item is CLEAR:
+                        self.write_rows(connection, rows)
+                        rows = []
+                        connection.execute("DELETE FROM history")
+                        cleared += 1
+                    else:
+                        rows.append(item)
+                self.write_rows(connection, rows)
+                # Read in the transaction, so it counts rows other
+                # processes committed before this one and none after
+                count = self.newest_id(connection)
+            # Committed: move the batch from pending to count in one step
+            with self.lock:
+                for item in batch:
+                    # Rows queued before a clear() are no longer pending
+                    if self.pending and self.pending[0] is item:
+                        self.pending.popleft()
+                self.count = count
+                self.clears -= cleared
+            for _ in batch:
+                self.queue.task_done()
+        connection.close()
+
+    @staticmethod
+    def write_rows(connection, rows):
+        """Insert (timestamp, expression, result) rows"""
+        if rows:
+            connection.executemany(
+                "INSERT INTO history (timestamp, expression, result) VALUES (?, ?, ?)", rows)
+
+    @staticmethod
+    def newest_id(connection):
+        """Return the newest id in the database, or 0 when it is empty"""
+        return connection.execute("SELECT max(id) FROM history").fetchone()[0] or 0
+
+    def committed(self):
+        """Return the number of committed rows, which is also the newest id"""
+        # Called with the lock held, since count and clears change together
+        if self.clears:
+            return 0
+        if not self.pending:
+            # None of this store's rows can be between its commit and
+            # leaving pending, so the database cannot count one twice
+            self.count = self.newest_id(self.connection)
+        return self.count
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pending) + self.committed()
+
+    def recent(self, limit, offset=0):
+        """Return (timestamp, expression, result) rows, newest first
+
+        Queued rows come first, then committed ones fetched by id, so any
+        page takes the same time however far back it is.
+        """
+        with self.lock:
+            pending = len(self.pending)
+            rows = [self.pending[pending - 1 - index]
+                    for index in range(offset, min(offset + limit, pending))]
+            newest = self.committed() - max(offset - pending, 0)
+        # Rows up to newest stay committed while the writer appends, so
+        # they are read without the lock
+        limit -= len(rows)
+        if limit > 0 and newest > 0:
+            rows += self.connection.execute(
+                "SELECT timestamp, expression, result FROM history"
+                " WHERE id <= ? AND id > ? ORDER BY id DESC",
+                (newest, newest - limit)).fetchall()
+        return rows
+
+    def search(self, text, limit=1000):
+        """Return rows whose expression starts with text or whose result is text
+
+        Rare matches are found through the expression and result indexes
+        and sorted; common ones by walking the timestamp index newest
+        first until limit rows match. Either way a search takes
+        milliseconds however long the history is. Rows still waiting in
+        the write queue are not included.
+        """
+        if self.clears:
+            return []
+        parameters = (text, text + PREFIX_END, text)
+        matches = self.connection.execute(
+            f"SELECT count(*) FROM (SELECT 1 FROM history WHERE {MATCH} LIMIT ?)",
+            parameters + (DENSE_MATCHES,)).fetchone()[0]
+        index = "INDEXED BY history_timestamp" if matches >= DENSE_MATCHES else ""
+        return self.connection.execute(
+            f"SELECT timestamp, expression, result FROM history {index}"
+            f" WHERE {MATCH} ORDER BY timestamp DESC LIMIT ?",
+            parameters + (limit,)).fetchall()
@@ -0,0 +1,119 @@
+class GapBuffer:
+    """Editable character sequence with amortized O(1) edits at the cursor
+
+    Characters live in a list with a gap at the cursor position. Typing
+    fills the gap, backspace widens it, and moving the cursor shifts
+    only the characters it passes over.
+    """
+
+    def __init__(self, text='', capacity=64):
+        self.buffer = list(text) + [''] * max(capacity - len(text), 16)
+        self.gap_start = len(text)
+        self.gap_end = len(self.buffer)
+        # Lowest position edited since the last take_changed()
+        self.changed_from = 0
+
+    def __len__(self):
+        return len(self.buffer) - (self.gap_end - self.gap_start)
+
+    @property
+    def cursor(self):
+        """Position of the cursor, counted in characters from the start"""
+        return self.gap_start
+
+    def text(self):
+        """Return the full contents as a string"""
+        return ''.join(self.buffer[:self.gap_start]) + ''.join(self.buffer[self.gap_end:])
+
+    def __getitem__(self, index):
+        """Return the characters of a slice as a string, joining only those"""
+        start, end, _ = index.indices(len(self))
+        end = max(start, end)
+        gap_start = self.gap_start
+        gap = self.gap_end - gap_start
+        if end <= gap_start:
+            return ''.join(self.buffer[start:end])
+        if start >= gap_start:
+            return ''.join(self.buffer[start + gap:end + gap])
+        return ''.join(self.buffer[start:gap_start]) + ''.join(self.buffer[self.gap_end:end + gap])
+
+    def equals(self, text):
+        """Check the contents against a string without joining a longer buffer"""
+        return len(self) == len(text) and self.text() == text
+
+    def before_cursor(self):
+        """Return the character left of the cursor, or '' at the start"""
+        return self.buffer[self.gap_start - 1] if self.gap_start else ''
+
+    def take_changed(self):
+        """Return the lowest position edited since the last call, and reset it"""
+        changed = self.changed_from
+        self.changed_from = len(self)
+        return changed
+
+    def set(self, text):
+        """Replace the contents and put the cursor at the end"""
+        self.buffer = list(text) + [''] * max(len(text), 16)
+        self.gap_start = len(text)
+        self.gap_end = len(self.buffer)
+        self.changed_from = 0
+
+    def insert(self, text):
+        """Insert text at the cursor and move the cursor past it"""
+        if len(text) > self.gap_end - self.gap_start:
+            self.grow(len(text))
+        self.changed_from = min(self.changed_from, self.gap_start)
+        end = self.gap_start + len(text)
+        self.buffer[self.gap_start:end] = text
+        self.gap_start = end
+
+    def delete_before(self, count=1):
+        """Delete up to count characters left of the cursor"""
+        self.gap_start = max(self.gap_start - count, 0)
+        self.changed_from = min(self.changed_from, self.gap_start)
+
+    def move_to(self, position):
+        """Move the cursor to an absolute position, clamped to the text"""
+        position = min(max(position, 0), len(self))
+        buffer = self.buffer
+        if position < self.gap_start:
+            moved = self.gap_start - position
+            buffer[self.gap_end - moved:self.gap_end] = buffer[position:self.gap_start]
+            self.gap_end -= moved
+        elif position > self.gap_start:
+            moved = position - self.gap_start
+            buffer[self.gap_start:position] = buffer[self.gap_end:self.gap_end + moved]
+            self.gap_end += moved
+        self.gap_start = position
+
+    def move(self, offset):
+        """Move the cursor by offset characters"""
+        self.move_to(self.gap_start + offset)
+
+    def grow(self, needed):
+        """Enlarge the gap to hold at least needed more characters"""
+        extra = max(needed, len(self.buffer))
+        self.buffer[self.gap_end:self.gap_end] = [''] * extra
+        self.gap_end += extra
+
+
+def window(text, position, width):
+    """Cut text to about width characters around position for display
+
+    text is a string or a GapBuffer; only the characters shown are
+    joined. Returns the cut text, with an ellipsis where something was
+    left out on either side, and position's index within it. Text that
+    fits is returned whole.
+    """
+    if len(text) <= width:
+        return text[:], position
+    start = min(max(position - width // 2, 0), len(text) - width)
+    end = start + width
+    shown = text[start:end]
+    position -= start
+    if start:
+        shown = '…' + shown
+        position += 1
+    if end < len(text):
+        shown += '…'
+    return shown, position
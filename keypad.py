@@ -0,0 +1,101 @@
+import tkinter as tk
+from themes import button_class
+
+ROLES = ('digit', 'operator', 'special')
+
+
+class CanvasKeypad:
+    """Keypad drawn on a single Canvas instead of one Button per key
+
+    Every key is a rectangle and a text item, created once and only
+    moved when the canvas is resized. Keys are tagged with their role,
+    so hover and theme changes are a few itemconfig calls on tags, and
+    clicks are hit-tested by looking the pointer's grid cell up in a
+    precomputed dict.
+    """
+
+    def __init__(self, parent, keys, font, on_click, options, gap=3):
+        self.on_click = on_click
+        self.options = options
+        self.gap = gap
+        top = min(row for _, row, _ in keys)
+        self.rows = max(row for _, row, _ in keys) - top + 1
+        self.columns = max(column for _, _, column in keys) + 1
+        # (row, column) -> (text, role, rectangle id, text id)
+        self.cells = {}
+        self.hovered = None
+        cell_width = font.measure('0') * 4 + 2 * gap + 16
+        cell_height = font.metrics('linespace') * 2 + 2 * gap + 8
+        self.canvas = tk.Canvas(
+            parent,
+            width=cell_width * self.columns,
+            height=cell_height * self.rows,
+            bg=options['frame']['bg'],
+            highlightthickness=0,
+            borderwidth=0
+        )
+        for text, row, column in keys:
+            if not text:
+                continue
+            role = button_class(text)
+            rectangle = self.canvas.create_rectangle(
+                0, 0, 0, 0, width=0, fill=options[role]['bg'], tags=(f'{role}-key',))
+            label = self.canvas.create_text(
+                0, 0, text=text, font=font, fill=options[role]['fg'], tags=(f'{role}-label',))
+            self.cells[row - top, column] = (text, role, rectangle, label)
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.layout(cell_width * self.columns, cell_height * self.rows)
+        self.canvas.bind('<Configure>', lambda event: self.layout(event.width, event.height))
+        self.canvas.bind('<Button-1>', self.on_press)
+        self.canvas.bind('<Motion>', self.on_motion)
+        self.canvas.bind('<Leave>', lambda event: self.hover(None))
+
+    def layout(self, width, height):
+        """Move every key to fill a canvas of the given size"""
+        self.cell_width = width / self.columns
+        self.cell_height = height / self.rows
+        gap = self.gap
+        for (row, column), (_, _, rectangle, label) in self.cells.items():
+            left = column * self.cell_width
+            top = row * self.cell_height
+            self.canvas.coords(rectangle, left + gap, top + gap,
+                               left + self.cell_width - gap, top + self.cell_height - gap)
+            self.canvas.coords(label, left + self.cell_width / 2, top + self.cell_height / 2)
+
+    def cell_at(self, x, y):
+        """Return the grid cell of the key under a point, or None where there is no key"""
+        cell = (int(y // self.cell_height), int(x // self.cell_width))
+        return cell if cell in self.cells else None
+
+    def on_press(self, event):
+        """Click the key under the pointer"""
+        cell = self.cell_at(event.x, event.y)
+        if cell is not None:
+            self.on_click(self.cells[cell][0])
+
+    def on_motion(self, event):
+        """Highlight the key under the pointer"""
+        cell = self.cell_at(event.x, event.y)
+        if cell != self.hovered:
+            self.hover(cell)
+
+    def hover(self, cell):
+        """Move the highlight to another key, or clear it when cell is None"""
+        if self.hovered is not None:
+            _, role, rectangle, _ = self.cells[self.hovered]
+            self.canvas.itemconfig(rectangle, fill=self.options[role]['bg'])
+        if cell is not None:
+            _, role, rectangle, _ = self.cells[cell]
+            self.canvas.itemconfig(rectangle, fill=self.options[role]['activebackground'])
+        self.hovered = cell
+
+    def apply_theme(self, options):
+        """Recolor all keys with one itemconfig per role and item kind"""
+        self.options = options
+        self.canvas.config(bg=options['frame']['bg'])
+        for role in ROLES:
+            self.canvas.itemconfig(f'{role}-key', fill=options[role]['bg'])
+            self.canvas.itemconfig(f'{role}-label', fill=options[role]['fg'])
+        if self.hovered is not None:
+            self.hover(self.hovered)
@@ -0,0 +1,151 @@
+import json
+import os
+from bisect import bisect_left
+
+# Upper bounds in seconds of the latency histogram buckets, 1us to 10s;
+# written out so the Prometheus le labels read exactly as here
+BUCKETS = (
+    1e-06, 2.5e-06, 5e-06,
+    1e-05, 2.5e-05, 5e-05,
+    0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0,
+    10.0,
+)
+
+PREFIX = 'calculator_'
+
+COUNTER_HELP = {
+    'calculations': "Calculations evaluated, by outcome",
+    'cache_lookups': "Result cache lookups, by result",
+    'errors': "Calculations that failed, by stage and exception type",
+}
+
+
+def escape(value):
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    """Format (name, value) pairs as a Prometheus label set"""
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+class Metrics:
+    """Counters and per-stage latency histograms, dumped to a file on demand
+
+    Recording is a dict lookup and a bisect, cheap enough for the hot
+    path; code that is not collecting metrics passes None instead of an
+    instance and skips it altogether. Worker processes drain() their own
+    instance after each job and the parent merge()s the snapshot.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        # (name, ((label, value), ...)) -> count
+        self.counters = {}
+        # stage -> count per bucket, with a last one for +Inf
+        self.buckets = {}
+        # stage -> total seconds
+        self.sums = {}
+
+    def count(self, name, **labels):
+        """Add one to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + 1
+
+    def observe(self, stage, seconds):
+        """Record how long one run of a stage took"""
+        counts = self.buckets.get(stage)
+        if counts is None:
+            counts = self.buckets[stage] = [0] * (len(BUCKETS) + 1)
+            self.sums[stage] = 0.0
+        counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sums[stage] += seconds
+
+    def drain(self):
+        """Return everything recorded so far as a picklable snapshot and start over"""
+        snapshot = (self.counters, self.buckets, self.sums)
+        self.counters = {}
+        self.buckets = {}
+        self.sums = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add a snapshot from drain(), usually taken in another process"""
+        counters, buckets, sums = snapshot
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for stage, counts in buckets.items():
+            mine = self.buckets.get(stage)
+            if mine is None:
+                self.buckets[stage] = list(counts)
+                self.sums[stage] = sums[stage]
+            else:
+                for index, value in enumerate(counts):
+                    mine[index] += value
+                self.sums[stage] += sums[stage]
+
+    def cumulative(self, stage):
+        """Return (upper bound, observations at or below it) pairs for a stage"""
+        total = 0
+        pairs = []
+        for bound, value in zip(BUCKETS + ('+Inf',), self.buckets[stage]):
+            total += value
+            pairs.append((bound, total))
+        return pairs
+
+    def to_json(self):
+        """Return the metrics as a JSON document"""
+        counters = [
+            {'name': name, 'labels': dict(labels), 'value': value}
+            for (name, labels), value in sorted(self.counters.items())
+        ]
+        stages = {
+            stage: {
+                'count': sum(self.buckets[stage]),
+                'sum': self.sums[stage],
+                'buckets': {str(bound): total for bound, total in self.cumulative(stage)},
+            }
+            for stage in sorted(self.buckets)
+        }
+        return json.dumps({'counters': counters, 'stages': stages}, indent=2)
+
+    def to_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format"""
+        lines = []
+        previous = None
+        for (name, labels), value in sorted(self.counters.items()):
+            metric = f'{PREFIX}{name}_total'
+            if name != previous:
+                if name in COUNTER_HELP:
+                    lines.append(f'# HELP {metric} {COUNTER_HELP[name]}')
+                lines.append(f'# TYPE {metric} counter')
+                previous = name
+            lines.append(f'{metric}{format_labels(labels)} {value}')
+        if self.buckets:
+            metric = f'{PREFIX}stage_seconds'
+            lines.append(f'# HELP {metric} Time spent in each stage of a calculation')
+            lines.append(f'# TYPE {metric} histogram')
+        for stage in sorted(self.buckets):
+            for bound, total in self.cumulative(stage):
+                labels = format_labels((('stage', stage), ('le', bound)))
+                lines.append(f'{metric}_bucket{labels} {total}')
+            labels = format_labels((('stage', stage),))
+            lines.append(f'{metric}_sum{labels} {self.sums[stage]!r}')
+            lines.append(f'{metric}_count{labels} {sum(self.buckets[stage])}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path=None):
+        """Write the metrics to path, as JSON if it ends in .json, else as Prometheus text"""
+        path = path if path is not None else self.path
+        if path is None:
+            return
+        text = self.to_json() if path.endswith('.json') else self.to_prometheus()
+        temporary = path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as handle:
+            handle.write(text)
+        os.replace(temporary, path)
@@ -0,0 +1,201 @@
+import operator
+from collections import namedtuple
+from engine import (
+    BINARY_OPERATORS,
+    GROUP_PRECEDENCE,
+    POWER_PRECEDENCE,
+    UNARY_OPERATORS,
+    UNARY_PRECEDENCE,
+    format_result,
+    parse_number,
+)
+
+# Expressions with a power or any other intermediate integer needing more
+# bits than this are not previewed, which bounds every step and the final
+# formatting alike
+MAX_PREVIEW_BITS = 100_000
+
+# values and operators are persistent linked lists of (head, tail) pairs,
+# so every state can share structure with the one before it. operators
+# holds (precedence, function, is_unary) entries, with GROUP standing for
+# an open parenthesis. number is the start of
+# the literal being typed, or None; symbol is a * or / that a repeat
+# would turn into ** or //.
+State = namedtuple('State', 'values operators number dot expect_operand symbol has_operator')
+
+INITIAL = State(None, None, None, False, True, None, False)
+DEAD = None
+GROUP = (GROUP_PRECEDENCE, None, False)
+
+
+def safe_pow(base, exponent):
+    """Python's ** with a size guard so previews never stall the UI"""
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+        if base.bit_length() * exponent > MAX_PREVIEW_BITS:
+            raise OverflowError("Result too large to preview")
+    return base ** exponent
+
+
+def apply(entry, values):
+    """Apply one pending operator to the value stack and return the new stack"""
+    _, function, is_unary = entry
+    right, values = values
+    if is_unary:
+        return function(right), values
+    left, values = values
+    if function is operator.pow:
+        value = safe_pow(left, right)
+    else:
+        value = function(left, right)
+    # Each operand is within the limit, so computing value was cheap, but
+    # a chain of products of such values would not stay so
+    if value.__class__ is int and value.bit_length() > MAX_PREVIEW_BITS:
+        raise OverflowError("Result too large to preview")
+    return value, values
+
+
+class IncrementalEvaluator:
+    """Evaluates an expression as it is typed, one character at a time
+
+    The parser state after every character is kept, so appending costs
+    O(1) amortized and backspace is a pop. Operators are applied as soon
+    as precedence allows, leaving only a short stack to fold for the
+    preview.
+    """
+
+    def __init__(self):
+        self.chars = []
+        self.states = [INITIAL]
+
+    def __len__(self):
+        return len(self.chars)
+
+    def rewind(self, length):
+        """Forget everything typed after the first length characters"""
+        del self.chars[length:]
+        del self.states[length + 1:]
+
+    def feed(self, text):
+        """Consume characters typed at the end of the expression"""
+        for char in text:
+            self.states.append(self.step(self.states[-1], char))
+            self.chars.append(char)
+
+    def backspace(self):
+        """Undo the last character"""
+        if self.chars:
+            self.chars.pop()
+            self.states.pop()
+
+    def reset(self, text=''):
+        """Start over with new contents"""
+        self.rewind(0)
+        self.feed(text)
+
+    def step(self, state, char):
+        """Return the state after one more character"""
+        if state is DEAD:
+            return DEAD
+        try:
+            if '0' <= char <= '9' or char == '.':
+                return self.push_char(state, char)
+            if char in UNARY_OPERATORS or char in BINARY_OPERATORS:
+                return self.push_operator(state, char)
+            if char == '(' or char == ')':
+                return self.push_parenthesis(state, char)
+        except (ArithmeticError, ValueError):
+            pass
+        return DEAD
+
+    def push_char(self, state, char):
+        """Extend or start the numeric literal being typed"""
+        if state.number is None:
+            if not state.expect_operand:
+                return DEAD
+            return state._replace(number=len(self.chars), dot=char == '.',
+                                  expect_operand=False, symbol=None)
+        if char == '.':
+            if state.dot:
+                return DEAD
+            return state._replace(dot=True)
+        return state
+
+    def push_operator(self, state, symbol):
+        """Handle an operator character after a literal or another operator"""
+        if state.symbol is not None and symbol == state.symbol:
+            # A repeated * or / means ** or //; redo it from before the first
+            return self.push_binary(self.states[-2], symbol * 2, len(self.chars) - 1)
+        if state.number is not None:
+            state = self.finish_number(state)
+        if state.expect_operand:
+            if symbol not in UNARY_OPERATORS:
+                return DEAD
+            entry = (UNARY_PRECEDENCE, UNARY_OPERATORS[symbol], True)
+            return state._replace(operators=(entry, state.operators), symbol=None)
+        return self.push_binary(state, symbol)
+
+    def push_binary(self, state, symbol, end=None):
+        """Reduce what binds tighter than a binary operator, then push it"""
+        if state.number is not None:
+            state = self.finish_number(state, end)
+        precedence, function = BINARY_OPERATORS[symbol]
+        values, operators = state.values, state.operators
+        if precedence != POWER_PRECEDENCE:
+            while operators is not None and operators[0][0] >= precedence:
+                values = apply(operators[0], values)
+                operators = operators[1]
+        entry = (precedence, function, False)
+        return State(values, (entry, operators), None, False, True,
+                     symbol if symbol in ('*', '/') else None, True)
+
+    def push_parenthesis(self, state, char):
+        """Open a group, or close one by applying everything pushed since it opened"""
+        if char == '(':
+            if not state.expect_operand:
+                return DEAD
+            return state._replace(operators=(GROUP, state.operators), symbol=None)
+        if state.number is not None:
+            state = self.finish_number(state)
+        if state.expect_operand:
+            return DEAD
+        values, operators = state.values, state.operators
+        while operators is not None and operators[0] is not GROUP:
+            values = apply(operators[0], values)
+            operators = operators[1]
+        if operators is None:
+            return DEAD
+        return state._replace(values=values, operators=operators[1], symbol=None)
+
+    def finish_number(self, state, end=None):
+        """Turn the literal ending at end into a value on the stack"""
+        value = parse_number(''.join(self.chars[state.number:end]))
+        return state._replace(values=(value, state.values), number=None, dot=False)
+
+    def preview(self):
+        """Return the formatted value of what has been typed, or None
+
+        Trailing operators are ignored, so '12+3*' previews 15. Nothing
+        is previewed until a binary operator has been typed, while a
+        parenthesis is left open, or when the input cannot be evaluated.
+        """
+        index = len(self.states) - 1
+        while index and self.states[index] is not DEAD and self.states[index].expect_operand:
+            index -= 1
+        state = self.states[index]
+        if state is DEAD or not state.has_operator or state.expect_operand:
+            return None
+        try:
+            if state.number is not None:
+                value = parse_number(''.join(self.chars[state.number:index]))
+                values = (value, state.values)
+            else:
+                values = state.values
+            operators = state.operators
+            while operators is not None:
+                if operators[0] is GROUP:
+                    return None
+                values = apply(operators[0], values)
+                operators = operators[1]
+            return format_result(values[0])
+        except (ArithmeticError, ValueError):
+            return None
@@ -0,0 +1,395 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import signal
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from cache import ResultCache
+from engine import (DEFAULT_COST_BUDGET, DEFAULT_PRECISION, ERROR, FLOAT, MODES, TOO_COMPLEX,
+                    cache_key, calculate, compile_expression, cost_precision, estimate_cost,
+                    exact_arithmetic, normalize)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8502
+
+# Expressions estimated to cost at most this much (about a third of a
+# millisecond) are evaluated on the event loop; dearer ones go to the pool
+INLINE_COST = 10 ** 4
+
+# Longer expressions go to the pool without being estimated here, since
+# tokenizing and converting their literals is itself slow: a million
+# digits hold the event loop for most of a second
+INLINE_LENGTH = 1000
+
+# Batches longer than this are split into chunks evaluated in the pool
+INLINE_BATCH = 64
+BATCH_CHUNK = 512
+
+# Requests a client may have in flight on one connection
+PIPELINE_DEPTH = 32
+
+# Seconds an idle keep-alive connection is held open
+KEEPALIVE_TIMEOUT = 60
+
+MAX_BODY = 4 << 20
+MAX_HEADERS = 100
+MAX_PRECISION = 10_000
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error',
+    501: 'Not Implemented',
+}
+
+Request = namedtuple('Request', 'method path headers body keep_alive')
+
+
+class HTTPError(Exception):
+    """A request the server answers with an error status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def estimate(expression, mode, precision=DEFAULT_PRECISION):
+    """Return the estimated cost of an expression, or None if it does not compile
+
+    Decimal division and powers are charged by precision, so a square root
+    to thousands of digits goes to the pool rather than the event loop.
+    """
+    try:
+        if mode == FLOAT:
+            program = compile_expression(expression)
+        else:
+            program = exact_arithmetic().compile_exact(expression)
+    except Exception:
+        return None
+    return estimate_cost(program, mode != FLOAT, cost_precision(mode, precision))
+
+
+def calculate_all(expressions, budget, mode, precision):
+    """Evaluate a chunk of expressions in a pool process"""
+    return [calculate(expression, None, budget, mode, precision) for expression in expressions]
+
+
+async def read_request(reader):
+    """Read one HTTP/1.x request, or return None when the client has closed the connection"""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode('latin-1').rstrip('\r\n').split(' ')
+    except ValueError:
+        raise HTTPError(400, "malformed request line") from None
+    if not version.startswith('HTTP/1.'):
+        raise HTTPError(400, "unsupported protocol version")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HTTPError(431, "too many header fields")
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'transfer-encoding' in headers:
+        raise HTTPError(501, "chunked request bodies are not supported")
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(400, "bad Content-Length") from None
+    if length < 0:
+        raise HTTPError(400, "bad Content-Length")
+    if length > MAX_BODY:
+        raise HTTPError(413, f"request bodies are limited to {MAX_BODY} bytes")
+    body = await reader.readexactly(length) if length else b''
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.0':
+        keep_alive = connection == 'keep-alive'
+    else:
+        keep_alive = connection != 'close'
+    return Request(method, target.partition('?')[0], headers, body, keep_alive)
+
+
+def encode_response(status, payload, keep_alive):
+    """Return the bytes of a JSON response"""
+    body = json.dumps(payload).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+class EvaluationServer:
+    """Serves the calculator engine as JSON over HTTP/1.1
+
+    POST /evaluate takes {"expression": ...} and POST /batch takes
+    {"expressions": [...]}; both accept optional "mode" and "precision".
+    Connections are kept alive and requests may be pipelined: each is
+    handled as soon as it is read and the answers are written back in
+    order. Cheap expressions are evaluated on the event loop and the rest
+    in a process pool, so one large power cannot stall other clients.
+    """
+
+    def __init__(self, workers=None, cache=None, budget=DEFAULT_COST_BUDGET, mode=FLOAT,
+                 precision=DEFAULT_PRECISION):
+        self.workers = workers
+        self.cache = cache if cache is not None else ResultCache()
+        self.budget = budget
+        self.mode = mode
+        self.precision = precision
+        self.pool = self.start_pool()
+
+    def start_pool(self):
+        """Start the process pool for expensive work
+
+        Its processes are spawned rather than forked: a fork would inherit
+        the sockets of clients connected at the time and keep them open
+        after the server closes them.
+        """
+        return ProcessPoolExecutor(self.workers, multiprocessing.get_context('spawn'))
+
+    async def offload(self, function, *args):
+        """Run function in the process pool, starting a new pool if the old one broke"""
+        pool = self.pool
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, function, *args)
+        except BrokenProcessPool:
+            # A worker died, e.g. killed for memory; every job in flight
+            # fails, and the first to notice replaces the pool
+            if self.pool is pool:
+                pool.shutdown(wait=False)
+                self.pool = self.start_pool()
+            raise
+
+    async def evaluate(self, expression, mode, precision):
+        """Return the display text for one normalized expression"""
+        key = cache_key(expression, mode, precision)
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+        # A long expression is not even estimated here; calculate does
+        # that in the pool, refusing it there if it is over budget
+        short = len(expression) <= INLINE_LENGTH
+        cost = estimate(expression, mode, precision) if short else None
+        if short and cost is None:
+            result = ERROR
+        elif short and self.budget and cost > self.budget:
+            result = TOO_COMPLEX
+        elif short and cost <= INLINE_COST:
+            result = calculate(expression, None, 0, mode, precision)
+        else:
+            try:
+                result = await self.offload(calculate, expression, None, self.budget, mode,
+                                            precision)
+            except BrokenProcessPool:
+                return ERROR
+        self.cache.put(key, result)
+        return result
+
+    async def evaluate_batch(self, expressions, mode, precision):
+        """Return the display text for each of a list of normalized expressions"""
+        if len(expressions) <= INLINE_BATCH:
+            return await asyncio.gather(*[self.evaluate(expression, mode, precision)
+                                          for expression in expressions])
+        chunks = [expressions[start:start + BATCH_CHUNK]
+                  for start in range(0, len(expressions), BATCH_CHUNK)]
+        try:
+            results = await asyncio.gather(*[
+                self.offload(calculate_all, chunk, self.budget, mode, precision) for chunk in chunks])
+        except BrokenProcessPool:
+            return [ERROR] * len(expressions)
+        return [result for chunk in results for result in chunk]
+
+    def settings(self, document):
+        """Return the mode and precision a request asks for, or the server's"""
+        mode = document.get('mode', self.mode)
+        if mode not in MODES:
+            raise HTTPError(400, f"mode must be one of {', '.join(MODES)}")
+        precision = document.get('precision', self.precision)
+        if type(precision) is not int or not 1 <= precision <= MAX_PRECISION:
+            raise HTTPError(400, f"precision must be an integer from 1 to {MAX_PRECISION}")
+        return mode, precision
+
+    async def route(self, request):
+        """Return the status and JSON payload answering a request"""
+        if request.path == '/health':
+            if request.method != 'GET':
+                raise HTTPError(405, "use GET")
+            return 200, {'status': 'ok'}
+        if request.path not in ('/evaluate', '/batch'):
+            raise HTTPError(404, f"no such endpoint {request.path}")
+        if request.method != 'POST':
+            raise HTTPError(405, "use POST")
+        try:
+            document = json.loads(request.body)
+        except ValueError:
+            raise HTTPError(400, "the body must be a JSON object") from None
+        if not isinstance(document, dict):
+            raise HTTPError(400, "the body must be a JSON object")
+        mode, precision = self.settings(document)
+        if request.path == '/evaluate':
+            expression = document.get('expression')
+            if not isinstance(expression, str):
+                raise HTTPError(400, "expression must be a string")
+            expression = normalize(expression)
+            return 200, {'expression': expression,
+                         'result': await self.evaluate(expression, mode, precision)}
+        expressions = document.get('expressions')
+        if not isinstance(expressions, list) or not all(isinstance(item, str) for item in expressions):
+            raise HTTPError(400, "expressions must be a list of strings")
+        expressions = [normalize(expression) for expression in expressions]
+        return 200, {'results': await self.evaluate_batch(expressions, mode, precision)}
+
+    async def respond(self, request):
+        """Return the encoded response to a request"""
+        try:
+            status, payload = await self.route(request)
+        except HTTPError as error:
+            status, payload = error.status, {'error': str(error)}
+        except Exception as error:
+            # Answer rather than leave the pipeline waiting on this request
+            status, payload = 500, {'error': f"{type(error).__name__}: {error}"}
+        return encode_response(status, payload, request.keep_alive)
+
+    async def handle_connection(self, reader, writer):
+        """Read requests off a connection and answer them in order until it closes"""
+        responses = asyncio.Queue(PIPELINE_DEPTH)
+        sending = asyncio.create_task(self.send_responses(responses, writer))
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), KEEPALIVE_TIMEOUT)
+                except HTTPError as error:
+                    answer = asyncio.get_running_loop().create_future()
+                    answer.set_result(encode_response(error.status, {'error': str(error)}, False))
+                    await responses.put(answer)
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError,
+                        ConnectionError):
+                    # Idle, cut off mid-request or a header line over the
+                    # stream limit; there is nothing sensible to answer
+                    break
+                if request is None:
+                    break
+                await responses.put(asyncio.ensure_future(self.respond(request)))
+                if not request.keep_alive:
+                    break
+            await responses.put(None)
+            await sending
+        except asyncio.CancelledError:
+            # The server is shutting down; returning instead of raising
+            # keeps Python 3.11 from logging the handler as failed
+            pass
+        finally:
+            sending.cancel()
+            writer.close()
+
+    async def send_responses(self, responses, writer):
+        """Write answers in the order their requests arrived"""
+        while True:
+            answer = await responses.get()
+            if answer is None:
+                return
+            try:
+                writer.write(await answer)
+                await writer.drain()
+            except ConnectionError:
+                # The client went away; drop whatever else it asked for
+                while answer is not None:
+                    answer.cancel()
+                    answer = await responses.get()
+                return
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Accept connections until cancelled or sent SIGTERM"""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        addresses = ', '.join(str(socket.getsockname()) for socket in server.sockets)
+        print(f"evaluation service listening on {addresses}", file=sys.stderr)
+        try:
+            # Stop like on Ctrl+C so the pool processes are shut down too
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM,
+                                                          asyncio.current_task().cancel)
+        except NotImplementedError:
+            pass
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+
+
+def build_parser():
+    """Build the command line parser of the evaluation service"""
+    parser = argparse.ArgumentParser(description="Calculator evaluation service, JSON over HTTP")
+    parser.add_argument(
+        '--host',
+        default=DEFAULT_HOST,
+        help="address to listen on (default: %(default)s)"
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=DEFAULT_PORT,
+        help="port to listen on (default: %(default)s)"
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help="processes for expensive expressions and long batches (default: one per CPU)"
+    )
+    parser.add_argument(
+        '--cost-budget',
+        type=int,
+        default=DEFAULT_COST_BUDGET,
+        help="refuse expressions estimated to cost more limb operations "
+             "than this; 0 disables the check (default: %(default)s)"
+    )
+    parser.add_argument(
+        '--arithmetic',
+        choices=MODES,
+        default=FLOAT,
+        help="arithmetic for requests that do not ask for a mode (default: %(default)s)"
+    )
+    parser.add_argument(
+        '--precision',
+        type=int,
+        default=DEFAULT_PRECISION,
+        help="decimal precision for requests that do not ask for one (default: %(default)s)"
+    )
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=4096,
+        help="maximum number of cached results (default: %(default)s)"
+    )
+    return parser
+
+
+def main(argv=None):
+    """Run the evaluation service until interrupted"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not 1 <= args.precision <= MAX_PRECISION:
+        parser.error(f"--precision must be from 1 to {MAX_PRECISION}")
+    server = EvaluationServer(args.workers, ResultCache(args.cache_size), args.cost_budget,
+                              args.arithmetic, args.precision)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
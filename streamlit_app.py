@@ -0,0 +1,177 @@
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import streamlit as st
+from engine import (DEFAULT_COST_BUDGET, DEFAULT_PRECISION, ERROR, FLOAT, MODES, TOO_COMPLEX,
+                    calculate, exact_arithmetic, normalize)
+from server import INLINE_COST, estimate
+
+HISTORY_SIZE = 1000
+
+# Highest decimal precision the sidebar offers: a fractional power at it
+# takes some tens of milliseconds in the pool, where the server's limit
+# of 10000 digits would take seconds for every square root asked for
+MAX_DECIMAL_PRECISION = 1000
+
+# Results kept by st.cache_data, shared by every session
+RESULT_CACHE_SIZE = 4096
+
+# Same keys as the Tk keypad; blank cells stay empty
+BUTTONS = [
+    ['M+', 'M-', 'MR', 'MC', '⌫'],
+    ['7', '8', '9', '/', 'C'],
+    ['4', '5', '6', '*', '('],
+    ['1', '2', '3', '-', ')'],
+    ['0', '.', '=', '+', ''],
+]
+
+TYPED_CHARACTERS = frozenset('0123456789.+-*/()')
+
+
+@st.cache_resource
+def evaluation_pool():
+    """Process pool shared by all sessions for expressions too dear to run in a script thread
+
+    Every session's script runs on a thread of one server process, so a
+    long integer power evaluated in place would hold the GIL and stall
+    the reruns of everyone else.
+    """
+    return ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+
+
+@st.cache_data(max_entries=RESULT_CACHE_SIZE, show_spinner="Calculating...")
+def evaluate(expression, mode, precision, budget=DEFAULT_COST_BUDGET):
+    """Return the display text for a normalized expression, computed once for all sessions"""
+    cost = estimate(expression, mode, precision)
+    if cost is None:
+        return ERROR
+    if budget and cost > budget:
+        return TOO_COMPLEX
+    if cost <= INLINE_COST:
+        return calculate(expression, None, 0, mode, precision)
+    pool = evaluation_pool()
+    try:
+        return pool.submit(calculate, expression, None, budget, mode, precision).result()
+    except BrokenProcessPool:
+        # A worker died, e.g. killed for memory; every job in flight
+        # fails, and the first to notice replaces the pool for everyone.
+        # Raising rather than returning keeps the failure out of the cache
+        if evaluation_pool() is pool:
+            evaluation_pool.clear()
+            pool.shutdown(wait=False)
+        raise
+
+
+def format_history(timestamp, expression, result):
+    """Format one calculation as a line of the history panel"""
+    return f"{time.strftime('%H:%M:%S', time.localtime(timestamp))}: {expression} = {result}"
+
+
+def init_session():
+    """Give a new browser session its input, memory and history"""
+    state = st.session_state
+    if 'input' not in state:
+        state.input = '0'
+        # Held exactly as a Fraction, whatever the arithmetic mode
+        state.memory = 0
+        # Lines are formatted once when added, so reruns only join them
+        state.history = deque(maxlen=HISTORY_SIZE)
+
+
+def input_is_placeholder(text):
+    """Check whether the input is 0 or an error that typing replaces"""
+    return text in {'0', ERROR, TOO_COMPLEX}
+
+
+def handle_memory(state, operation):
+    """Handle memory operations, keeping results exact as the Tk calculator does"""
+    exact = exact_arithmetic()
+    try:
+        if operation == 'M+':
+            state.memory += exact.parse_result(state.input)
+        elif operation == 'M-':
+            state.memory -= exact.parse_result(state.input)
+        elif operation == 'MR':
+            state.input = exact.format_in_mode(exact.Fraction(state.memory), state.mode,
+                                               state.precision)
+        elif operation == 'MC':
+            state.memory = 0
+    except (ValueError, ArithmeticError):
+        state.input = ERROR
+
+
+def calculate_input(state):
+    """Evaluate the input and record successful calculations"""
+    expression = normalize(state.input)
+    try:
+        result = evaluate(expression, state.mode, state.precision)
+    except BrokenProcessPool:
+        result = ERROR
+    state.input = result
+    if result not in {ERROR, TOO_COMPLEX}:
+        state.history.appendleft(format_history(time.time(), expression, result))
+
+
+def press(text):
+    """Handle a keypad button; runs before the rerun it triggers"""
+    state = st.session_state
+    if text in {'M+', 'M-', 'MR', 'MC'}:
+        handle_memory(state, text)
+    elif text in TYPED_CHARACTERS:
+        if input_is_placeholder(state.input):
+            state.input = '0' + text if text in '+-*/' else text
+        else:
+            state.input += text
+    elif text == '⌫':
+        state.input = '0' if input_is_placeholder(state.input) else state.input[:-1] or '0'
+    elif text == 'C':
+        state.input = '0'
+    elif text == '=':
+        calculate_input(state)
+
+
+def clear_history():
+    """Clear the history"""
+    st.session_state.history.clear()
+
+
+def show_keypad():
+    """Lay the keypad out as a grid of buttons"""
+    for row, keys in enumerate(BUTTONS):
+        for column, (cell, text) in enumerate(zip(st.columns(len(keys)), keys)):
+            if text:
+                cell.button(text, key=f'key-{row}-{column}', on_click=press, args=(text,),
+                            width='stretch')
+
+
+def show_history():
+    """Show the calculations matching the search box, newest first"""
+    st.subheader("Calculation History")
+    text = normalize(st.text_input("Search", key='history_search'))
+    lines = st.session_state.history
+    if text:
+        lines = [line for line in lines
+                 if line.partition(': ')[2].startswith(text) or line.endswith(' = ' + text)]
+    st.text('\n'.join(lines) or "No calculations yet")
+    st.button("Clear History", on_click=clear_history)
+
+
+def main():
+    st.set_page_config(page_title="Vishwa's Ultimate Calculator", layout='wide')
+    init_session()
+    with st.sidebar:
+        st.selectbox("Arithmetic", MODES, index=MODES.index(FLOAT), key='mode')
+        st.number_input("Decimal precision", min_value=1, max_value=MAX_DECIMAL_PRECISION,
+                        value=DEFAULT_PRECISION, key='precision')
+    keypad, history = st.columns([3, 2])
+    with keypad:
+        st.text_input("Expression", key='input')
+        show_keypad()
+    with history:
+        show_history()
+
+
+if __name__ == "__main__":
+    main()
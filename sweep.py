@@ -0,0 +1,216 @@
+import math
+from engine import (DEFAULT_COST_BUDGET, ERROR, TOO_COMPLEX, compile_expression, estimate_cost,
+                    evaluate, format_result, normalize, parse_number, preflight, run)
+from vectorized import EXACT_INTEGER_LIMIT, np, run_columns
+
+# The name an expression sweeps over
+VARIABLE = 'x'
+
+# Sweeps longer than this would not fit in memory comfortably
+MAX_ROWS = 20_000_000
+
+# Lets a float stop that step lands on up to rounding still count as reached
+STOP_TOLERANCE = 1e-9
+
+# Rows formatted and written at a time when exporting
+CSV_CHUNK = 65536
+
+
+def fast_power(left, right, integer, errors, fallback):
+    """Element-wise ** with numpy's power, for sweeps too long for a Python loop
+
+    Unlike vectorized.power this may differ from Python's pow in the last
+    place. Overflow and roots of negative numbers come out as inf and nan,
+    which the caller flags; only 0 to a negative power needs flagging here.
+    """
+    errors |= (left == 0) & (right < 0)
+    return np.power(left, right)
+
+
+def parse_bound(text, name, budget=DEFAULT_COST_BUDGET):
+    """Evaluate a start, stop or step field, which may itself be an expression"""
+    expression = normalize(text)
+    if preflight(expression, budget) is None:
+        try:
+            value = evaluate(expression)
+        except Exception:
+            pass
+        else:
+            if value.__class__ is int or math.isfinite(value):
+                return value
+    raise ValueError(f"Bad {name}")
+
+
+def count_rows(start, stop, step):
+    """Return how many rows go from start to stop inclusive in steps of step"""
+    if not step:
+        raise ValueError("Step must not be zero")
+    if start.__class__ is int and stop.__class__ is int and step.__class__ is int:
+        rows = (stop - start) // step + 1
+    else:
+        span = (stop - start) / step
+        rows = math.floor(span + STOP_TOLERANCE) + 1 if span <= MAX_ROWS else MAX_ROWS + 1
+    if rows < 1:
+        raise ValueError("Step leads away from stop")
+    if rows > MAX_ROWS:
+        raise ValueError(f"More than {MAX_ROWS:,} rows")
+    return rows
+
+
+def format_float(value):
+    """Format a finite float the way format_result does"""
+    if value.is_integer():
+        return str(int(value))
+    return str(round(value, 10))
+
+
+class Table:
+    """The rows of a sweep, formatted only when shown or exported
+
+    values, errors and fallback are the numpy results; with values None
+    (no numpy, or literals too large for float64) every row is computed
+    by the scalar engine on demand instead.
+    """
+
+    def __init__(self, expression, program, positions, start, step, rows,
+                 values=None, errors=None, fallback=None, budget=DEFAULT_COST_BUDGET):
+        self.expression = expression
+        self.program = program
+        self.positions = positions
+        self.start = start
+        self.step = step
+        self.rows = rows
+        self.values = values
+        self.errors = errors
+        self.fallback = fallback
+        self.budget = budget
+
+    def __len__(self):
+        return self.rows
+
+    def x(self, row):
+        """Return the value of x on a row; for floats this is the same sum numpy made"""
+        return self.start + row * self.step
+
+    def x_text(self, row):
+        x = self.x(row)
+        return str(x) if x.__class__ is int else format_float(x)
+
+    def exact_text(self, row):
+        """Compute one row with the scalar engine, exactly as calculate would"""
+        items = list(self.program)
+        x = self.x(row)
+        for index in self.positions:
+            items[index] = x
+        try:
+            if self.budget and estimate_cost(items) > self.budget:
+                return TOO_COMPLEX
+            return format_result(run(items))
+        except Exception:
+            return ERROR
+
+    def text(self, row):
+        """Return the display text of the result on a row"""
+        if self.values is None or self.fallback[row]:
+            return self.exact_text(row)
+        if self.errors[row]:
+            return ERROR
+        return format_float(float(self.values[row]))
+
+    def lines(self, offset, limit):
+        """Return table lines for rows from offset on"""
+        return [f"f({self.x_text(row)}) = {self.text(row)}"
+                for row in range(offset, min(offset + limit, self.rows))]
+
+    def chunk_texts(self, offset, end):
+        """Return the result texts of rows offset to end for the CSV file
+
+        Values are written at full precision rather than rounded for the
+        display, since the file is meant for other programs.
+        """
+        if self.values is None:
+            return [self.exact_text(row) for row in range(offset, end)]
+        texts = [str(int(value)) if value.is_integer() else repr(value)
+                 for value in self.values[offset:end].tolist()]
+        flagged = self.errors[offset:end] | self.fallback[offset:end]
+        for index in flagged.nonzero()[0].tolist():
+            texts[index] = self.text(offset + index)
+        return texts
+
+    def write_csv(self, path):
+        """Write x and the result of every row to a CSV file, a chunk at a time"""
+        with open(path, 'w', encoding='utf-8', newline='') as handle:
+            handle.write(f'x,"{self.expression}"\n')
+            for offset in range(0, self.rows, CSV_CHUNK):
+                end = min(offset + CSV_CHUNK, self.rows)
+                if self.start.__class__ is int and self.step.__class__ is int:
+                    xs = map(str, range(self.x(offset), self.x(end), self.step))
+                elif self.values is None:
+                    xs = map(self.x, range(offset, end))
+                else:
+                    xs = (self.start + np.arange(offset, end, dtype=np.float64) * self.step).tolist()
+                handle.write(''.join(f"{x},{text}\n"
+                                     for x, text in zip(xs, self.chunk_texts(offset, end))))
+
+
+def compile_sweep(expression):
+    """Compile an expression in x and return (program, positions of x)"""
+
+    def parse(token):
+        if token == VARIABLE:
+            return VARIABLE
+        if token[0].isalpha() or token[0] == '_':
+            raise ValueError(f"Unknown name {token}")
+        return parse_number(token)
+
+    program = compile_expression(expression, parse)
+    positions = [index for index, item in enumerate(program) if item == VARIABLE]
+    return program, positions
+
+
+def sweep(expression, start, stop, step, budget=DEFAULT_COST_BUDGET):
+    """Tabulate an expression in x from start to stop inclusive
+
+    The expression is compiled once and, with numpy, evaluated over the
+    whole range as arrays through vectorized.run_columns. Rows Python
+    would have refused and non-finite results are flagged as ERROR the
+    way calculate does; integer rows that may be inexact in float64 are
+    recomputed exactly when they are formatted. Arithmetic is always
+    binary float, like the preview. Raises ValueError for an expression
+    that does not compile or a range that cannot be swept.
+    """
+    expression = normalize(expression)
+    program, positions = compile_sweep(expression)
+    rows = count_rows(start, stop, step)
+    table = Table(expression, program, positions, start, step, rows, budget=budget)
+    literals = [item for item in program if not callable(item) and item != VARIABLE]
+    if np is None or any(literal.__class__ is int and abs(literal) >= EXACT_INTEGER_LIMIT
+                         for literal in literals):
+        return table
+
+    x_integer = start.__class__ is int and step.__class__ is int
+    xs = start + np.arange(rows, dtype=np.float64) * step
+    skeleton = []
+    columns = []
+    integers = []
+    for item in program:
+        if callable(item):
+            skeleton.append(item)
+            continue
+        skeleton.append(len(columns))
+        if item == VARIABLE:
+            columns.append(xs)
+            integers.append(x_integer)
+        else:
+            columns.append(np.float64(item))
+            integers.append(item.__class__ is int)
+    with np.errstate(all='ignore'):
+        values, errors, fallback = run_columns(skeleton, columns, integers, rows, fast_power)
+        values = np.broadcast_to(values, rows)
+        errors = errors | ~np.isfinite(values)
+        if x_integer:
+            fallback = fallback | ~(np.abs(xs) < EXACT_INTEGER_LIMIT)
+    table.values = values
+    table.errors = errors
+    table.fallback = fallback
+    return table
@@ -0,0 +1,165 @@
+import threading
+import time
+import tkinter as tk
+from tkinter import filedialog
+from sweep import parse_bound, sweep
+from virtuallist import VirtualList
+
+# Fields of the form with their starting text
+FIELDS = (('f(x)', 'x**2'), ('start', '0'), ('stop', '10'), ('step', '1'))
+
+# How often a running export is checked on, in milliseconds
+EXPORT_POLL_MS = 100
+
+
+class TableWindow:
+    """Window that tabulates an expression in x over a range
+
+    The rows come from a sweep.Table through a VirtualList, so only the
+    rows in view are ever formatted and a table of millions of rows draws
+    as fast as a short one. CSV export runs on a thread and is polled
+    with after(), keeping the window responsive while a long table is
+    written.
+    """
+
+    def __init__(self, root, font, button_font, options, budget):
+        self.budget = budget
+        self.table = None
+        self.export_thread = None
+        self.export_error = None
+        self.window = tk.Toplevel(root)
+        self.window.title("Function Table")
+        self.frame = tk.Frame(self.window, **options['history_frame'])
+        self.frame.pack(fill=tk.BOTH, expand=True)
+
+        form = tk.Frame(self.frame, **options['history_frame'])
+        form.pack(fill=tk.X, padx=5, pady=5)
+        self.labels = []
+        self.entries = []
+        self.fields = {}
+        for column, (name, text) in enumerate(FIELDS):
+            variable = tk.StringVar(value=text)
+            label = tk.Label(form, text=name, font=font, **options['history_label'])
+            label.grid(row=0, column=column, sticky='w', padx=2)
+            entry = tk.Entry(form, textvariable=variable, font=font, relief=tk.FLAT,
+                             width=20 if column == 0 else 8, **options['search'])
+            entry.grid(row=1, column=column, sticky='ew', padx=2)
+            self.labels.append(label)
+            self.entries.append(entry)
+            self.fields[name] = variable
+        form.grid_columnconfigure(0, weight=1)
+        self.frames = [self.frame, form]
+
+        controls = tk.Frame(self.frame, **options['history_frame'])
+        controls.pack(fill=tk.X, padx=5)
+        self.frames.append(controls)
+        self.buttons = []
+        for text, command in (("Tabulate", self.tabulate), ("Export CSV", self.export)):
+            button = tk.Button(controls, text=text, command=command, font=button_font,
+                               borderwidth=0, relief='flat', **options['special'])
+            button.pack(side=tk.LEFT, padx=(0, 5))
+            self.buttons.append(button)
+        self.status = tk.StringVar()
+        self.status_label = tk.Label(controls, textvariable=self.status, font=font,
+                                     anchor=tk.E, **options['history_label'])
+        self.status_label.pack(side=tk.RIGHT, fill=tk.X, expand=True)
+        self.labels.append(self.status_label)
+
+        self.list = VirtualList(
+            self.frame,
+            font,
+            self.row_count,
+            self.rows,
+            fg=options['history_list']['fg'],
+            bg=options['history_list']['bg'],
+            height=15,
+            borderwidth=0
+        )
+        self.list.scrollbar.pack(side="right", fill="y")
+        self.list.canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.window.bind('<Return>', self.tabulate)
+        self.entries[0].focus_set()
+
+    def exists(self):
+        """Check whether the window is still open"""
+        return bool(self.window.winfo_exists())
+
+    def lift(self):
+        self.window.deiconify()
+        self.window.lift()
+
+    def row_count(self):
+        return len(self.table) if self.table is not None else 0
+
+    def rows(self, offset, limit):
+        return self.table.lines(offset, limit) if self.table is not None else []
+
+    def tabulate(self, event=None):
+        """Sweep the expression over the range in the fields and show the rows"""
+        fields = self.fields
+        started = time.perf_counter()
+        try:
+            table = sweep(fields['f(x)'].get(),
+                          parse_bound(fields['start'].get(), 'start', self.budget),
+                          parse_bound(fields['stop'].get(), 'stop', self.budget),
+                          parse_bound(fields['step'].get(), 'step', self.budget),
+                          self.budget)
+        except ValueError as error:
+            self.status.set(str(error))
+            self.window.bell()
+            return
+        elapsed = time.perf_counter() - started
+        self.table = table
+        self.list.top = 0
+        self.list.refresh()
+        self.status.set(f"{len(table):,} rows in {elapsed * 1000:.0f} ms")
+
+    def export(self):
+        """Ask for a file name and write the table to it as CSV"""
+        if self.table is None or (self.export_thread is not None and self.export_thread.is_alive()):
+            self.window.bell()
+            return
+        path = filedialog.asksaveasfilename(parent=self.window, defaultextension='.csv',
+                                            filetypes=[("CSV files", "*.csv"), ("All files", "*")])
+        if path:
+            self.start_export(self.table, path)
+
+    def start_export(self, table, path):
+        """Write table to path on a thread and report when it is done"""
+        self.export_error = None
+        self.export_thread = threading.Thread(target=self.write_csv, args=(table, path),
+                                              daemon=True)
+        self.export_thread.start()
+        self.status.set(f"Exporting {len(table):,} rows...")
+        self.window.after(EXPORT_POLL_MS, self.poll_export, path)
+
+    def write_csv(self, table, path):
+        """Runs on the export thread; errors are left for poll_export to report"""
+        try:
+            table.write_csv(path)
+        except OSError as error:
+            self.export_error = error
+
+    def poll_export(self, path):
+        """Report the export once its thread has finished"""
+        if not self.exists():
+            return
+        if self.export_thread.is_alive():
+            self.window.after(EXPORT_POLL_MS, self.poll_export, path)
+        elif self.export_error is not None:
+            self.status.set(f"Export failed: {self.export_error.strerror}")
+            self.window.bell()
+        else:
+            self.status.set(f"Exported to {path}")
+
+    def apply_theme(self, options):
+        """Recolor the window with a theme's role options"""
+        for frame in self.frames:
+            frame.config(**options['history_frame'])
+        for label in self.labels:
+            label.config(**options['history_label'])
+        for entry in self.entries:
+            entry.config(**options['search'])
+        for button in self.buttons:
+            button.config(**options['special'])
+        self.list.config(**options['history_list'])
@@ -0,0 +1,77 @@
+OPERATOR_BUTTONS = frozenset({'+', '-', '*', '/', '=', '(', ')'})
+SPECIAL_BUTTONS = frozenset({'C', '⌫', 'M+', 'M-', 'MR', 'MC'})
+
+# Widget options of each role, mapped to the palette colors they take
+ROLES = {
+    'frame': {'bg': 'bg_color'},
+    'display': {'bg': 'display_bg', 'fg': 'display_fg', 'readonlybackground': 'display_bg'},
+    'preview': {'bg': 'display_bg', 'fg': 'history_fg'},
+    'history_frame': {'bg': 'history_bg'},
+    'history_label': {'bg': 'history_bg', 'fg': 'history_fg'},
+    'history_list': {'bg': 'history_disabled_bg', 'fg': 'history_fg'},
+    'search': {'bg': 'history_bg', 'fg': 'history_fg', 'insertbackground': 'history_fg'},
+    'digit': {
+        'bg': 'button_bg',
+        'fg': 'button_fg',
+        'activebackground': 'button_active_bg',
+        'activeforeground': 'button_fg',
+    },
+    'operator': {
+        'bg': 'operator_bg',
+        'fg': 'operator_fg',
+        'activebackground': 'operator_active_bg',
+        'activeforeground': 'operator_fg',
+    },
+    'special': {
+        'bg': 'special_bg',
+        'fg': 'special_fg',
+        'activebackground': 'special_active_bg',
+        'activeforeground': 'special_fg',
+    },
+}
+
+COLORS = frozenset(key for options in ROLES.values() for key in options.values())
+
+
+def button_class(text):
+    """Return the role of a keypad button: 'operator', 'special' or 'digit'"""
+    if text in OPERATOR_BUTTONS:
+        return 'operator'
+    if text in SPECIAL_BUTTONS:
+        return 'special'
+    return 'digit'
+
+
+class Theme:
+    """A named palette with the widget options of every role worked out once"""
+
+    def __init__(self, name, colors, dark=False):
+        missing = COLORS - colors.keys()
+        if missing:
+            raise ValueError(f"Theme {name!r} is missing colors: {', '.join(sorted(missing))}")
+        self.name = name
+        self.colors = dict(colors)
+        self.dark = dark
+        self.options = {
+            role: {option: self.colors[key] for option, key in options.items()}
+            for role, options in ROLES.items()
+        }
+
+    def __repr__(self):
+        return f"Theme({self.name!r})"
+
+
+def load_theme(path, light, dark):
+    """Load a theme from a JSON file
+
+    The file holds an object with a "name", an optional "dark" flag and
+    a "colors" object keyed like the palettes in COLORS. Colors it leaves
+    out are taken from dark when the flag is set, otherwise from light.
+    """
+    import json
+    with open(path, encoding='utf-8') as handle:
+        data = json.load(handle)
+    is_dark = bool(data.get('dark', False))
+    colors = dict((dark if is_dark else light).colors)
+    colors.update(data.get('colors', {}))
+    return Theme(data.get('name', path), colors, is_dark)
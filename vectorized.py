@@ -0,0 +1,186 @@
+import operator
+import re
+from engine import (
+    DEFAULT_COST_BUDGET,
+    ERROR,
+    UNARY_FUNCTIONS,
+    calculate,
+    compile_expression,
+)
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; fall back to the scalar engine
+    np = None
+
+# Same number syntax as engine.TOKEN_REGEX; the group makes re.split
+# return the numbers interleaved with the text between them
+NUMBER_SPLIT = re.compile(r'([0-9]+\.?[0-9]*|\.[0-9]+)')
+
+# Integers beyond this are not exact in float64, so rows whose integer
+# arithmetic reaches it are handed back to the exact scalar engine
+EXACT_INTEGER_LIMIT = 2.0 ** 53
+
+# Longer integer literals may not be exact in float64
+MAX_INTEGER_DIGITS = 15
+
+
+def compile_skeleton(separators):
+    """Compile the text between numbers into a program over operand columns
+
+    Every number becomes a placeholder literal; spaces around it keep
+    adjacent numbers from merging, so malformed rows still fail to
+    compile. Operands are replaced by their column index.
+    """
+    program = []
+    column = 0
+    for item in compile_expression(' 1 '.join(separators)):
+        if callable(item):
+            program.append(item)
+        else:
+            program.append(column)
+            column += 1
+    return program
+
+
+def power(left, right, integer, errors, fallback):
+    """Element-wise ** using Python's own float pow
+
+    numpy's power may differ from libm in the last place, which would
+    show through the 10-digit rounding, so this stays exact at the cost
+    of a Python-level loop. Rows that raise are flagged in errors, or in
+    fallback when an exact integer power overflowed float64.
+    """
+    value = np.empty_like(left)
+    rows = zip(left.tolist(), right.tolist(), integer.tolist())
+    for row, (base, exponent, is_integer) in enumerate(rows):
+        try:
+            value[row] = base ** exponent
+        except ZeroDivisionError:
+            errors[row] = True
+            value[row] = np.nan
+        except OverflowError:
+            if is_integer:
+                fallback[row] = True
+            else:
+                errors[row] = True
+            value[row] = np.nan
+    return value
+
+
+def run_columns(program, columns, integers, rows=None, power=power):
+    """Evaluate a skeleton program over operand columns
+
+    integers marks which operands were integer literals. Returns
+    (values, errors, fallback): rows where Python would have raised are
+    flagged in errors; rows whose integer arithmetic might not be exact
+    in float64 are flagged in fallback. columns may also be a list mixing
+    arrays of length rows with numpy scalars, which broadcast.
+    """
+    if rows is None:
+        rows = columns.shape[1]
+    errors = np.zeros(rows, dtype=bool)
+    fallback = np.zeros(rows, dtype=bool)
+    stack = []
+    for item in program:
+        if not callable(item):
+            stack.append((columns[item], integers[item]))
+            continue
+        if item in UNARY_FUNCTIONS:
+            value, integer = stack.pop()
+            stack.append((-value if item is operator.neg else value, integer))
+            continue
+        right, right_integer = stack.pop()
+        left, left_integer = stack.pop()
+        integer = left_integer & right_integer
+        if item is operator.add:
+            value = left + right
+        elif item is operator.sub:
+            value = left - right
+        elif item is operator.mul:
+            value = left * right
+        elif item is operator.truediv:
+            errors |= right == 0
+            value = left / right
+            integer = np.zeros(rows, dtype=bool)
+        elif item is operator.floordiv:
+            errors |= right == 0
+            value = np.floor_divide(left, right)
+        else:
+            value = power(left, right, integer, errors, fallback)
+            # int ** negative int is a float in Python
+            integer = integer & (right >= 0)
+        fallback |= integer & ~(np.abs(value) < EXACT_INTEGER_LIMIT)
+        stack.append((value, integer))
+    value, _ = stack.pop()
+    return value, errors, fallback
+
+
+def calculate_group(separators, operands):
+    """Evaluate rows sharing one skeleton
+
+    Returns a list of display strings, with None for rows that must be
+    recomputed exactly by the scalar engine.
+    """
+    try:
+        program = compile_skeleton(separators)
+    except ValueError:
+        return [ERROR] * len(operands)
+    literals = np.array(operands, dtype=str).T
+    columns = literals.astype(np.float64)
+    lengths = np.char.str_len(literals)
+    integers = np.char.find(literals, '.') < 0
+    # Long integers and leading zeros (rejected by Python) go to the
+    # scalar engine, which reproduces both exactly
+    unsafe = integers & ((lengths > MAX_INTEGER_DIGITS)
+                         | ((lengths > 1) & np.char.startswith(literals, '0')))
+    values, errors, fallback = run_columns(program, columns, integers)
+    errors |= ~np.isfinite(values)
+    fallback |= unsafe.any(axis=0)
+    results = []
+    append = results.append
+    for value, error, exact in zip(values.tolist(), errors.tolist(), fallback.tolist()):
+        if exact:
+            append(None)
+        elif error:
+            append(ERROR)
+        elif value.is_integer():
+            append(str(int(value)))
+        else:
+            append(str(round(value, 10)))
+    return results
+
+
+def calculate_many(expressions, cache=None, budget=DEFAULT_COST_BUDGET):
+    """Return display results for normalized expressions, vectorizing shared shapes
+
+    Expressions that differ only in their numbers are parsed once and
+    evaluated as numpy columns. Results match engine.calculate row for
+    row; a failing row becomes ERROR without affecting its group.
+    """
+    if np is None:
+        return [calculate(expression, cache, budget) for expression in expressions]
+
+    groups = {}
+    split = NUMBER_SPLIT.split
+    for index, expression in enumerate(expressions):
+        parts = split(expression)
+        key = tuple(parts[0::2])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = ([], [])
+        group[0].append(index)
+        group[1].append(parts[1::2])
+
+    results = [None] * len(expressions)
+    with np.errstate(all='ignore'):
+        for separators, (indices, operands) in groups.items():
+            if not operands[0]:
+                # No numbers at all; the scalar engine reports the error
+                continue
+            for index, result in zip(indices, calculate_group(separators, operands)):
+                results[index] = result
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = calculate(expressions[index], cache, budget)
+    return results
@@ -0,0 +1,83 @@
+import tkinter as tk
+
+
+class VirtualList:
+    """Scrollable list of text rows that only draws the rows in view
+
+    Rows are not stored here. row_count() returns how many there are and
+    fetch_rows(offset, limit) returns the text of the rows from offset
+    on, so the source can be a database with millions of rows. The canvas
+    keeps one text item per visible line and redraws by changing their
+    text, so scrolling costs the same wherever it lands.
+    """
+
+    def __init__(self, parent, font, row_count, fetch_rows, fg, height=8, padding=8, **options):
+        self.font = font
+        self.row_count = row_count
+        self.fetch_rows = fetch_rows
+        self.fg = fg
+        self.padding = padding
+        self.row_height = font.metrics('linespace') + 2
+        self.top = 0
+        self.items = []
+        self.canvas = tk.Canvas(parent, height=height * self.row_height + 2 * padding,
+                                highlightthickness=0, **options)
+        self.scrollbar = tk.Scrollbar(parent, orient="vertical", command=self.yview)
+        self.canvas.bind('<Configure>', lambda event: self.refresh())
+        self.canvas.bind('<MouseWheel>', self.on_mousewheel)
+        self.canvas.bind('<Button-4>', lambda event: self.scroll(-3))
+        self.canvas.bind('<Button-5>', lambda event: self.scroll(3))
+
+    def visible_rows(self):
+        """Number of rows that fit in the canvas"""
+        height = self.canvas.winfo_height() - 2 * self.padding
+        return max(height // self.row_height + 1, 1)
+
+    def refresh(self):
+        """Redraw the visible rows, for example after the source changed"""
+        visible = self.visible_rows()
+        count = self.row_count()
+        self.top = max(min(self.top, count - visible + 1), 0)
+        while len(self.items) < visible:
+            self.items.append(self.canvas.create_text(
+                self.padding, self.padding + len(self.items) * self.row_height,
+                anchor=tk.NW, font=self.font, fill=self.fg, tags='row'))
+        rows = self.fetch_rows(self.top, visible)
+        for index, item in enumerate(self.items):
+            self.canvas.itemconfig(item, text=rows[index] if index < len(rows) else '')
+        if count:
+            self.scrollbar.set(self.top / count, min((self.top + visible) / count, 1.0))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def row_at(self, y):
+        """Return the index of the row drawn at canvas height y, or None"""
+        row = (y - self.padding) // self.row_height
+        if row < 0:
+            return None
+        index = self.top + row
+        return index if index < self.row_count() else None
+
+    def scroll(self, rows):
+        """Move the view down by rows, or up when negative"""
+        self.top = max(self.top + rows, 0)
+        self.refresh()
+
+    def yview(self, *args):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units' or 'pages')"""
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * self.row_count())
+            self.refresh()
+        elif args[0] == 'scroll':
+            step = self.visible_rows() - 1 if args[2] == 'pages' else 1
+            self.scroll(int(args[1]) * max(step, 1))
+
+    def on_mousewheel(self, event):
+        """Scroll three rows per wheel notch"""
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    def config(self, bg, fg):
+        """Change the colors of the list"""
+        self.fg = fg
+        self.canvas.config(bg=bg)
+        self.canvas.itemconfig('row', fill=fg)
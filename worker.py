@@ -0,0 +1,107 @@
+import multiprocessing
+from engine import DEFAULT_COST_BUDGET, DEFAULT_PRECISION, ERROR, FLOAT, calculate
+
+# A forked child would inherit the history writer thread and the
+# daemon's socket and X connection descriptors, so start a fresh
+# interpreter instead
+CONTEXT = multiprocessing.get_context('spawn')
+
+
+def serve(connection, budget, mode, precision, measure=False):
+    """Evaluate expressions received over a pipe until it is closed
+
+    With measure set, each result is sent with a snapshot of the metrics
+    recorded while computing it, for the parent to merge.
+    """
+    metrics = None
+    if measure:
+        from metrics import Metrics
+        metrics = Metrics()
+    while True:
+        try:
+            expression = connection.recv()
+        except (EOFError, OSError):
+            return
+        result = calculate(expression, budget=budget, mode=mode, precision=precision,
+                           metrics=metrics)
+        connection.send(result if metrics is None else (result, metrics.drain()))
+
+
+class EvaluationWorker:
+    """Evaluates expressions in a child process so the caller never blocks
+
+    Only one job is in flight at a time. Cancelling kills the process,
+    which is the only way to stop a long integer operation; a fresh one
+    is started on the next submit.
+    """
+
+    def __init__(self, budget=DEFAULT_COST_BUDGET, mode=FLOAT, precision=DEFAULT_PRECISION,
+                 metrics=None):
+        self.budget = budget
+        self.mode = mode
+        self.precision = precision
+        # Receives the child's per-stage timings and error counts
+        self.metrics = metrics
+        self.process = None
+        self.connection = None
+        self.busy = False
+        self.start()
+
+    def start(self):
+        """Start the child process if it is not already running"""
+        if self.process is not None and self.process.is_alive():
+            return
+        parent, child = CONTEXT.Pipe()
+        self.process = CONTEXT.Process(
+            target=serve, args=(child, self.budget, self.mode, self.precision,
+                                self.metrics is not None), daemon=True)
+        self.process.start()
+        child.close()
+        self.connection = parent
+
+    def submit(self, expression):
+        """Send a normalized expression to be evaluated"""
+        if self.busy:
+            raise RuntimeError("A calculation is already in progress")
+        self.start()
+        self.connection.send(expression)
+        self.busy = True
+
+    def result(self, timeout=0):
+        """Return the result if it arrives within timeout seconds, else None"""
+        if not self.busy:
+            return None
+        try:
+            if not self.connection.poll(timeout):
+                return None
+            result = self.connection.recv()
+        except (EOFError, OSError):
+            # The child died mid-calculation; report it like any failure
+            self.stop()
+            return ERROR
+        self.busy = False
+        if self.metrics is not None:
+            result, snapshot = result
+            self.metrics.merge(snapshot)
+        return result
+
+    def cancel(self):
+        """Abandon the job in flight by stopping the child process
+
+        The replacement is started straight away, so its interpreter has
+        usually finished starting by the time the next job is submitted.
+        """
+        if self.busy:
+            self.stop()
+            self.start()
+
+    def stop(self):
+        """Terminate the child process and forget any job in flight"""
+        self.busy = False
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
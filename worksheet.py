@@ -0,0 +1,210 @@
+import re
+from itertools import islice
+from engine import (DEFAULT_COST_BUDGET, DEFAULT_PRECISION, ERROR, FLOAT, FRACTION, TOO_COMPLEX,
+                    compile_expression, cost_precision, estimate_cost, exact_arithmetic,
+                    format_result, normalize, parse_number, run)
+
+NAME_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+# log2(10), for sizing Decimal values in bits
+LOG2_10 = 3.3219280948873626
+
+# Values longer than this are cut short in the panel
+ROW_TEXT_LIMIT = 40
+
+
+class Reference(str):
+    """A variable name standing in for its value in a compiled formula"""
+
+
+def cost_operand(value):
+    """Return something estimate_cost can size in place of a variable's value"""
+    if value.__class__ is int or value.__class__ is float:
+        return value
+    if hasattr(value, 'denominator'):
+        # A Fraction is about as costly as its larger half
+        return max(abs(value.numerator), value.denominator)
+    # A Decimal: an integer with as many digits
+    return 1 << int(len(value.as_tuple().digits) * LOG2_10)
+
+
+class Worksheet:
+    """Named variables whose formulas may refer to one another
+
+    Each formula is compiled once, with a Reference wherever it names a
+    variable. The graph is kept in both directions: dependencies maps a
+    variable to the names its formula uses, dependents maps a name to the
+    variables whose formulas use it. Changing a variable re-evaluates
+    only what lies downstream of it, each variable once and in
+    topological order, so the work grows with the part of the sheet that
+    is affected rather than with its size.
+    """
+
+    def __init__(self, mode=FLOAT, precision=DEFAULT_PRECISION, budget=DEFAULT_COST_BUDGET):
+        self.mode = mode
+        self.precision = precision
+        self.budget = budget
+        # name -> formula text, in the order variables were first defined
+        self.formulas = {}
+        # name -> (program, [(index, name) of each Reference])
+        self.programs = {}
+        self.dependencies = {}
+        self.dependents = {}
+        # name -> number, for variables that evaluated successfully
+        self.values = {}
+        # name -> display text, ERROR or TOO_COMPLEX
+        self.texts = {}
+
+    def __len__(self):
+        return len(self.formulas)
+
+    def __contains__(self, name):
+        return name in self.formulas
+
+    def compile(self, formula):
+        """Compile a formula and return (program, references)"""
+        if self.mode == FLOAT:
+            literal = parse_number
+        else:
+            literal = exact_arithmetic().parse_fixed
+
+        def parse(token):
+            if NAME_PATTERN.fullmatch(token):
+                return Reference(token)
+            return literal(token)
+
+        program = compile_expression(formula, parse)
+        references = [(index, item) for index, item in enumerate(program)
+                      if item.__class__ is Reference]
+        return program, references
+
+    def assign(self, statement):
+        """Apply a 'name = formula' statement and return the names recomputed
+
+        An empty formula removes the variable. Raises ValueError for a bad
+        name, a formula that does not compile or one that would make the
+        variable depend on itself; the worksheet is then left unchanged.
+        """
+        name, equals, formula = statement.partition('=')
+        name = name.strip()
+        if not equals or not NAME_PATTERN.fullmatch(name):
+            raise ValueError("Expected name = formula")
+        formula = normalize(formula)
+        if not formula:
+            return self.remove(name)
+        return self.define(name, formula)
+
+    def define(self, name, formula):
+        """Set a variable's formula and return the names recomputed, in order"""
+        program, references = self.compile(formula)
+        uses = {reference for _, reference in references}
+        if name in uses or self.downstream([name]) & uses:
+            raise ValueError(f"{name} would depend on itself")
+        for used in self.dependencies.get(name, set()) - uses:
+            self.dependents[used].discard(name)
+        for used in uses:
+            self.dependents.setdefault(used, set()).add(name)
+        self.dependencies[name] = uses
+        self.formulas[name] = formula
+        self.programs[name] = (program, references)
+        return self.recompute([name])
+
+    def remove(self, name):
+        """Delete a variable and return the names recomputed because they used it"""
+        if name not in self.formulas:
+            raise ValueError(f"No variable named {name}")
+        for used in self.dependencies.pop(name):
+            self.dependents[used].discard(name)
+        del self.formulas[name]
+        del self.programs[name]
+        del self.texts[name]
+        self.values.pop(name, None)
+        return self.recompute(self.dependents.get(name, ()))
+
+    def downstream(self, names):
+        """Return names and every variable that depends on them, directly or not"""
+        found = set(names)
+        stack = list(found)
+        while stack:
+            for dependent in self.dependents.get(stack.pop(), ()):
+                if dependent not in found:
+                    found.add(dependent)
+                    stack.append(dependent)
+        return found
+
+    def recompute(self, names):
+        """Re-evaluate names and everything downstream of them in topological order
+
+        Only the affected subgraph is visited: each variable in it waits
+        for its dependencies that are also in it, and none outside.
+        """
+        affected = self.downstream(names)
+        waiting = {name: sum(1 for used in self.dependencies[name] if used in affected)
+                   for name in affected if name in self.formulas}
+        ready = [name for name, count in waiting.items() if not count]
+        order = []
+        while ready:
+            name = ready.pop()
+            self.evaluate(name)
+            order.append(name)
+            for dependent in self.dependents.get(name, ()):
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    ready.append(dependent)
+        return order
+
+    def evaluate(self, name):
+        """Evaluate one variable from the current values of those it uses"""
+        program, references = self.programs[name]
+        self.values.pop(name, None)
+        items = list(program)
+        for index, reference in references:
+            value = self.values.get(reference)
+            if value is None:
+                # Undefined, or failed itself
+                self.texts[name] = ERROR
+                return
+            items[index] = value
+        try:
+            if self.budget:
+                costed = items
+                if self.mode != FLOAT:
+                    costed = list(items)
+                    for index, _ in references:
+                        costed[index] = cost_operand(items[index])
+                if estimate_cost(costed, self.mode != FLOAT,
+                                 cost_precision(self.mode, self.precision)) > self.budget:
+                    self.texts[name] = TOO_COMPLEX
+                    return
+            if self.mode == FLOAT:
+                value = run(items)
+                text = format_result(value)
+            else:
+                exact = exact_arithmetic()
+                if self.mode == FRACTION:
+                    value = exact.run_fraction(items)
+                else:
+                    value = exact.run_decimal(items, self.precision)
+                text = exact.format_exact(value)
+        except Exception:
+            self.texts[name] = ERROR
+            return
+        self.values[name] = value
+        self.texts[name] = text
+
+    def rows(self, offset, limit):
+        """Return panel lines for variables from offset on, in definition order"""
+        lines = []
+        for name in islice(self.formulas, offset, offset + limit):
+            formula = self.formulas[name]
+            text = self.texts[name]
+            if len(text) > ROW_TEXT_LIMIT:
+                text = text[:ROW_TEXT_LIMIT] + '…'
+            lines.append(f"{name} = {text}" if formula == text else f"{name} = {formula} = {text}")
+        return lines
+
+    def name_at(self, index):
+        """Return the name of the variable on a given row, or None"""
+        if index < 0:
+            return None
+        return next(islice(self.formulas, index, None), None)